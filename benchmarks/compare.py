@@ -0,0 +1,31 @@
+#! /usr/bin/env python
+from __future__ import unicode_literals, division, print_function
+import json
+from argparse import ArgumentParser
+
+def main():
+    # CLI arguments
+    parser = ArgumentParser(description="Compare two SLI benchmark results")
+    parser.add_argument("base", help="Base benchmark result file path")
+    parser.add_argument("new", help="New benchmark result file path")
+    # Parse arguments
+    cli_args = parser.parse_args()
+    with open(cli_args.base) as f:
+        base_results = json.load(f)["results"]
+    with open(cli_args.new) as f:
+        new_results = json.load(f)["results"]
+    # Speedup and peak allocated memory change of each common benchmark
+    print("{:<24}{:>16}{:>16}{:>10}{:>16}".format("benchmark", "base lines/s", "new lines/s", "speedup", "peak alloc"))
+    for bench_name in sorted(set(base_results) & set(new_results)):
+        base, new = base_results[bench_name], new_results[bench_name]
+        speedup = new["lines_per_sec"]/base["lines_per_sec"] if base["lines_per_sec"] else float("nan")
+        base_alloc, new_alloc = base.get("peak_alloc_kib"), new.get("peak_alloc_kib")
+        alloc_change = "{:+d} KiB".format(new_alloc-base_alloc) \
+            if base_alloc is not None and new_alloc is not None else "-"
+        print("{:<24}{:>16.0f}{:>16.0f}{:>9.2f}x{:>16}".format(
+            bench_name, base["lines_per_sec"] or 0, new["lines_per_sec"] or 0, speedup, alloc_change
+        ))
+    return 0
+
+if __name__=="__main__":
+    exit(main())
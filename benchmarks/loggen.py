@@ -0,0 +1,357 @@
+#! /usr/bin/env python
+from __future__ import unicode_literals, division, print_function
+import os, io, json, random, bisect
+from argparse import ArgumentParser
+from six import iteritems
+from six.moves import range
+
+# Default relative frequency of each system call
+DEFAULT_EVENT_MIX = {
+    "read": 20,
+    "write": 12,
+    "open": 8,
+    "close": 8,
+    "mmap": 5,
+    "futex": 10,
+    "access": 3,
+    "fcntl": 3,
+    "lseek": 3,
+    "clone": 1,
+    "poll": 4,
+    "recvfrom": 3,
+    "sendto": 3,
+    "getpid": 2
+}
+# Default relative frequency of each file descriptor type
+DEFAULT_FD_TYPE_MIX = {
+    "f": 60,
+    "4t": 12,
+    "4u": 6,
+    "u": 10,
+    "p": 8,
+    "e": 4
+}
+# Top-level directories of generated paths
+_TOP_DIRS = ["bin", "dev", "etc", "home", "lib", "proc", "run", "sbin", "sys", "tmp", "usr", "var", "opt", "srv"]
+# Path name components
+_PATH_WORDS = ["lib", "share", "cache", "log", "local", "conf", "data", "python3", "systemd", "x86_64-linux-gnu",
+    "nginx", "ssl", "certs", "user", "1000", "fd", "net", "kernel", "self", "ld.so.cache", "passwd", "stat",
+    "libc.so.6", "libm.so.6", "syslog", "auth.log", "index.html", "null", "urandom", "pts", "notify"]
+# Process names (Some with spaces and special characters)
+_PROCESS_NAMES = ["bash", "sshd", "python3", "nginx", "cron", "systemd-journal", "systemd", "dbus-daemon",
+    "postgres", "node", "java", "containerd", "dockerd", "kworker/0:1", "Web Content", "gnome-shell",
+    "rsyslogd", "apache2", "redis-server", "sudo"]
+# Option arguments of system calls
+_MMAP_PROT = ["1(PROT_READ)", "3(PROT_READ|PROT_WRITE)", "5(PROT_READ|PROT_EXEC)", "0(PROT_NONE)"]
+_MMAP_FLAGS = ["2(MAP_PRIVATE)", "34(MAP_PRIVATE|MAP_ANONYMOUS)", "1(MAP_SHARED)",
+    "2066(MAP_PRIVATE|MAP_FIXED|MAP_DENYWRITE)"]
+_FUTEX_OPS = ["129(FUTEX_PRIVATE_FLAG|FUTEX_WAKE)", "128(FUTEX_PRIVATE_FLAG|FUTEX_WAIT)", "1(FUTEX_WAKE)",
+    "393(FUTEX_CLOCK_REALTIME|FUTEX_PRIVATE_FLAG|FUTEX_WAIT_BITSET)"]
+_ACCESS_MODES = ["0(F_OK)", "4(R_OK)", "5(R_OK|X_OK)", "6(R_OK|W_OK)"]
+_OPEN_FLAGS = ["1(O_RDONLY)", "4098(O_RDWR|O_CLOEXEC)", "577(O_WRONLY|O_CREAT|O_TRUNC)",
+    "524289(O_RDONLY|O_CLOEXEC)", "1089(O_WRONLY|O_CREAT|O_APPEND)"]
+_FCNTL_CMDS = ["2(F_SETFD)", "1(F_GETFD)", "3(F_GETFL)", "4(F_SETFL)"]
+_LSEEK_WHENCE = ["0(SEEK_SET)", "1(SEEK_CUR)", "2(SEEK_END)"]
+_CLONE_FLAGS = ["25165824(CLONE_CHILD_CLEARTID|CLONE_CHILD_SETTID)",
+    "4001536(CLONE_VM|CLONE_FS|CLONE_FILES|CLONE_SIGHAND|CLONE_THREAD|CLONE_SYSVSEM)"]
+_ERRORS = ["-2(ENOENT)", "-11(EAGAIN)", "-13(EACCES)", "-9(EBADF)", "-4(EINTR)"]
+# Nano seconds in a day
+_NS_PER_DAY = 24*3600*(10**9)
+
+class _WeightedChoice(object):
+    def __init__(self, items):
+        """ Initialize weighted choice over (Item, weight) pairs. """
+        items = list(items)
+        ## Items
+        self.items = [item for item, _ in items]
+        ## Cumulative weights
+        self.cum_weights = _accumulate(weight for _, weight in items)
+    def __call__(self, rand):
+        return self.items[bisect.bisect(self.cum_weights, rand.random()*self.cum_weights[-1])]
+
+def _accumulate(weights):
+    """ Cumulative sums of weights. """
+    total = 0
+    cum_weights = []
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+    return cum_weights
+
+class LogGenerator(object):
+    def __init__(self, seed=0, event_mix=DEFAULT_EVENT_MIX, n_processes=12, fd_type_mix=DEFAULT_FD_TYPE_MIX,
+        n_paths=500, path_skew=1.1, switch_ratio=0.3, odd_ratio=0.01):
+        """ Initialize seeded generator of synthetic Sysdig text logs. """
+        ## Random number generator
+        self.rand = random.Random(seed)
+        ## Ratio of context switch events among all lines
+        self.switch_ratio = switch_ratio
+        ## Ratio of unusual (But valid) lines
+        self.odd_ratio = odd_ratio
+        ## Event choice
+        self.choose_event = _WeightedChoice(sorted(iteritems(event_mix)))
+        ## File descriptor type choice
+        self.choose_fd_type = _WeightedChoice(sorted(iteritems(fd_type_mix)))
+        ## Processes and their thread IDs
+        self.processes = [
+            (_PROCESS_NAMES[i%len(_PROCESS_NAMES)]+("" if i<len(_PROCESS_NAMES) else str(i)),
+                [self.rand.randint(100, 65535) for _ in range(self.rand.randint(1, 4))])
+            for i in range(n_processes)
+        ]
+        ## Path choice (Zipf distribution over generated paths)
+        self.choose_path = _WeightedChoice(
+            (self._random_path(), 1/((rank+1)**path_skew)) for rank in range(n_paths)
+        )
+        ## Event number of next line
+        self._evt_num = 0
+        ## Event time of next line
+        self._evt_time = self.rand.randint(0, _NS_PER_DAY-1)
+    def _random_path(self):
+        """ Random absolute path. """
+        depth = self.rand.randint(1, 5)
+        return "/"+"/".join([self.rand.choice(_TOP_DIRS)]+[self.rand.choice(_PATH_WORDS) for _ in range(depth)])
+    def _fd(self):
+        """ Random file descriptor argument value. """
+        fd_type = self.choose_fd_type(self.rand)
+        fd_val = self.rand.randint(0, 64)
+        if fd_type=="f":
+            location = self.choose_path(self.rand)
+        elif fd_type=="u":
+            location = self.rand.choice(["/run/systemd/notify", "/var/run/docker.sock", "/tmp/.X11-unix/X0", ""])
+        elif fd_type in ("4t", "4u"):
+            location = "127.0.0.1:{}->10.0.0.{}:{}".format(
+                self.rand.randint(1024, 65535), self.rand.randint(1, 254), self.rand.choice([80, 443, 5432])
+            )
+        else:
+            location = ""
+        return "{}(<{}>{})".format(fd_val, fd_type, location)
+    def _res(self):
+        """ Random result argument value. """
+        if self.rand.random()<0.1:
+            return self.rand.choice(_ERRORS)
+        return str(self.rand.randint(0, 4096))
+    def _event_args(self, evt_type, evt_dir):
+        """ Random arguments string of event. """
+        rand = self.rand
+        if evt_type=="switch":
+            return "next={} pgft_maj=0 pgft_min={} vm_size={} vm_rss={} vm_swap=0".format(
+                rand.randint(0, 65535), rand.randint(0, 100), rand.randint(1000, 900000), rand.randint(100, 90000)
+            )
+        # Exit events carry result
+        if evt_dir=="<":
+            if evt_type=="open":
+                path = self.choose_path(rand)
+                return "fd={}(<f>{}) name={} flags={} mode=0".format(
+                    rand.randint(3, 64), path, path, rand.choice(_OPEN_FLAGS)
+                )
+            elif evt_type=="mmap":
+                return "res={:X} vm_size={} vm_rss={} vm_swap=0".format(
+                    rand.randint(1<<40, 1<<47), rand.randint(1000, 900000), rand.randint(100, 90000)
+                )
+            elif evt_type in ("read", "recvfrom"):
+                return "res={} data={}".format(self._res(), self._data())
+            return "res={}".format(self._res())
+        if evt_type in ("read", "write", "recvfrom", "sendto"):
+            args = "fd={} size={}".format(self._fd(), rand.randint(1, 65536))
+            if evt_type=="write":
+                args += " data="+self._data()
+            return args
+        elif evt_type in ("close", "poll"):
+            return "fd={}".format(self._fd())
+        elif evt_type=="open":
+            return ""
+        elif evt_type=="mmap":
+            return "addr=0 length={} prot={} flags={} fd={} offset=0".format(
+                rand.randint(4096, 1<<24), rand.choice(_MMAP_PROT), rand.choice(_MMAP_FLAGS),
+                self._fd() if rand.random()<0.5 else "-1(EPERM)"
+            )
+        elif evt_type=="futex":
+            return "addr={:X} op={} val={}".format(rand.randint(1<<40, 1<<47), rand.choice(_FUTEX_OPS),
+                rand.randint(0, 2))
+        elif evt_type=="access":
+            return "mode={}".format(rand.choice(_ACCESS_MODES))
+        elif evt_type=="fcntl":
+            return "fd={} cmd={}".format(self._fd(), rand.choice(_FCNTL_CMDS))
+        elif evt_type=="lseek":
+            return "fd={} offset={} whence={}".format(self._fd(), rand.randint(0, 1<<20), rand.choice(_LSEEK_WHENCE))
+        elif evt_type=="clone":
+            return "exe=/usr/bin/{} args=-c echo ok. tid={} pid={} ptid={} cwd=/ fdlimit=1024 flags={}".format(
+                rand.choice(_PROCESS_NAMES), rand.randint(100, 65535), rand.randint(100, 65535),
+                rand.randint(100, 65535), rand.choice(_CLONE_FLAGS)
+            )
+        return ""
+    def _data(self):
+        """ Random data argument value. """
+        return self.rand.choice(["GET / HTTP/1.1..Host: localhost", "....", "hello world", "x=1 (y)=2 <z>",
+            "été 中文"])
+    def _odd_line(self, header):
+        """ Unusual but valid line. """
+        kind = self.rand.randint(0, 4)
+        # Blank line
+        if kind==0:
+            return ""
+        # Trailing whitespace
+        elif kind==1:
+            return header+" > getpid   "
+        # Very long data argument
+        elif kind==2:
+            return header+" < read res=4096 data="+"a=b (c) "*self.rand.randint(50, 500)
+        # Argument without value
+        elif kind==3:
+            return header+" > ioctl fd=3(<f>/dev/pts/0) request=5401 argument"
+        # Unknown event with empty arguments
+        return header+" > procexit "
+    def line(self):
+        """ Generate next log line. """
+        rand = self.rand
+        proc_name, tids = rand.choice(self.processes)
+        header = "{} {:02d}:{:02d}:{:02d}.{:09d} {} {} ({})".format(
+            self._evt_num,
+            self._evt_time//(3600*(10**9)), self._evt_time//(60*(10**9))%60, self._evt_time//(10**9)%60,
+            self._evt_time%(10**9),
+            rand.randint(0, 7),
+            proc_name,
+            rand.choice(tids)
+        )
+        self._evt_num += 1
+        self._evt_time = (self._evt_time+rand.randint(100, 50000))%_NS_PER_DAY
+        # Unusual line
+        if rand.random()<self.odd_ratio:
+            return self._odd_line(header)
+        # Context switch
+        if rand.random()<self.switch_ratio:
+            evt_type = "switch"
+            evt_dir = ">"
+        else:
+            evt_type = self.choose_event(rand)
+            evt_dir = rand.choice("><")
+        args = self._event_args(evt_type, evt_dir)
+        return "{} {} {} {}".format(header, evt_dir, evt_type, args).rstrip()
+    def write_log(self, path, n_lines):
+        """ Write log with given amount of lines and return amount of non-empty lines. """
+        n_written = 0
+        with io.open(path, "w", encoding="utf-8") as f:
+            for _ in range(n_lines):
+                line = self.line()
+                if line.strip():
+                    n_written += 1
+                f.write(line+"\n")
+        return n_written
+
+def write_log_dataset(dataset_root, amount_map, n_lines, seed=0, **kwargs):
+    """ Write log dataset with given amount of logs of each category (Each log is generated with its own seed).
+        Returns amount of non-empty lines of each category. """
+    n_written = {}
+    for i, (dataset_name, n_logs) in enumerate(sorted(iteritems(amount_map))):
+        n_written[dataset_name] = 0
+        dataset_dir = os.path.join(dataset_root, dataset_name)
+        if not os.path.exists(dataset_dir):
+            os.makedirs(dataset_dir)
+        for j in range(n_logs):
+            generator = LogGenerator(seed=seed*1000003+i*1009+j, **kwargs)
+            log_path = os.path.join(dataset_dir, "{}log-{}.txt".format(dataset_name, j+1))
+            n_written[dataset_name] += generator.write_log(log_path, n_lines)
+    with open(os.path.join(dataset_root, "amount.json"), "w") as f:
+        json.dump(amount_map, f)
+    return n_written
+
+def add_generator_arguments(parser):
+    """ Add log generator options to CLI argument parser. """
+    parser.add_argument(
+        "--seed",
+        default=0,
+        type=int,
+        help="Random seed"
+    )
+    parser.add_argument(
+        "--event-mix",
+        default=None,
+        help="JSON map of relative frequency of each system call"
+    )
+    parser.add_argument(
+        "--processes",
+        default=12,
+        type=int,
+        help="Number of processes"
+    )
+    parser.add_argument(
+        "--fd-type-mix",
+        default=None,
+        help="JSON map of relative frequency of each file descriptor type"
+    )
+    parser.add_argument(
+        "--paths",
+        default=500,
+        type=int,
+        help="Number of distinct file paths"
+    )
+    parser.add_argument(
+        "--path-skew",
+        default=1.1,
+        type=float,
+        help="Zipf exponent of file path distribution"
+    )
+    parser.add_argument(
+        "--switch-ratio",
+        default=0.3,
+        type=float,
+        help="Ratio of context switch events"
+    )
+    parser.add_argument(
+        "--odd-ratio",
+        default=0.01,
+        type=float,
+        help="Ratio of unusual lines (Blank lines, trailing whitespace, long data, etc.)"
+    )
+
+def generator_options(cli_args):
+    """ Log generator options from parsed CLI arguments. """
+    return {
+        "event_mix": json.loads(cli_args.event_mix) if cli_args.event_mix else DEFAULT_EVENT_MIX,
+        "n_processes": cli_args.processes,
+        "fd_type_mix": json.loads(cli_args.fd_type_mix) if cli_args.fd_type_mix else DEFAULT_FD_TYPE_MIX,
+        "n_paths": cli_args.paths,
+        "path_skew": cli_args.path_skew,
+        "switch_ratio": cli_args.switch_ratio,
+        "odd_ratio": cli_args.odd_ratio
+    }
+
+def main():
+    # CLI arguments
+    parser = ArgumentParser(description="Synthetic Sysdig log generator")
+    parser.add_argument(
+        "-o", "--output",
+        required=True,
+        help="Output log file path, or log dataset root directory if log amount map is given"
+    )
+    parser.add_argument(
+        "-l", "--lines",
+        default=100000,
+        type=int,
+        help="Number of lines in each log"
+    )
+    parser.add_argument(
+        "-n", "--log-amount-map",
+        default=None,
+        help="JSON map of log amount of each log category"
+    )
+    add_generator_arguments(parser)
+    # Parse arguments
+    cli_args = parser.parse_args()
+    options = generator_options(cli_args)
+    # Log dataset
+    if cli_args.log_amount_map:
+        write_log_dataset(
+            cli_args.output,
+            json.loads(cli_args.log_amount_map),
+            cli_args.lines,
+            cli_args.seed,
+            **options
+        )
+    # Single log
+    else:
+        LogGenerator(seed=cli_args.seed, **options).write_log(cli_args.output, cli_args.lines)
+    return 0
+
+if __name__=="__main__":
+    exit(main())
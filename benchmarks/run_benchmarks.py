@@ -0,0 +1,296 @@
+#! /usr/bin/env python
+from __future__ import unicode_literals, division, print_function
+import os, sys, json, time, shutil, tempfile, platform, subprocess
+from argparse import ArgumentParser, SUPPRESS
+from six.moves import range
+import numpy as np
+
+# Import package from source tree
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sli.parser import parse_line, parse_args_str
+from sli.processing import FreqCounter, lines_from_file, prefilter_lines
+from sli.pipeline import gen_training_dataset, gen_detection_dataset, feature_args, feature_passes, \
+    feature_generators, DEFAULT_EXCLUDE_EVENTS
+from sli.dataset import save_training_dataset, load_vocabulary
+from loggen import LogGenerator, write_log_dataset, add_generator_arguments, generator_options
+
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# CPU time of current process
+_process_time = time.process_time if hasattr(time, "process_time") else time.clock
+
+# Log features of stage benchmarks
+_STAGE_LOG_FEATURES = ["option-arg", "fd"]
+# Lines of each log counted by frequency counter
+_COUNT_LOG_LINES = 10000
+
+def _consume(stream):
+    """ Run pass over all items. """
+    return list(stream)
+
+def _fd_features_stage(lines):
+    generator = feature_generators(["fd"])[0]
+    for line in lines:
+        generator(line)
+    return lines
+
+def _process_lines_stage(lines):
+    freq_counter = FreqCounter(
+        processes=set(),
+        evt_feature_tuples=set(),
+        feature_generators=feature_generators(_STAGE_LOG_FEATURES)
+    )
+    log_file_datum = []
+    for i in range(0, len(lines), _COUNT_LOG_LINES):
+        log_file_datum += freq_counter.process_lines(training=True)(lines[i:i+_COUNT_LOG_LINES])
+    return freq_counter, log_file_datum
+
+def _counted_lines(counted):
+    return sum(lines_count for _, lines_count in counted[1])
+
+def _count_freq_stage(counted):
+    freq_counter, log_file_datum = counted
+    freq_counter.freq_matrix(log_file_datum)
+    return counted
+
+# Pipeline stages in order (Name, stage function and amount of lines processed by stage)
+_STAGES = [
+    ("lines_from_file", lambda log_path: _consume(lines_from_file(log_path)), len),
+    ("prefilter_lines", lambda lines: _consume(prefilter_lines(DEFAULT_EXCLUDE_EVENTS)(lines)), len),
+    ("parse_line", lambda lines: _consume(parse_line()(lines)), len),
+    ("parse_args_str", lambda lines: _consume(
+        parse_args_str(wanted_args=feature_args(_STAGE_LOG_FEATURES))(lines)
+    ), len),
+    ("parse_option_args", lambda lines: _consume(feature_passes(["option-arg"])[0](lines)), len),
+    ("parse_fd_args", lambda lines: _consume(feature_passes(["fd"])[0](lines)), len),
+    ("fd_features", _fd_features_stage, len),
+    ("process_lines", _process_lines_stage, _counted_lines),
+    ("count_freq", _count_freq_stage, _counted_lines)
+]
+_STAGE_NAMES = [name for name, _, _ in _STAGES]
+
+def _peak_rss():
+    """ Peak resident set size of current process in KiB (None if unavailable). """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS
+    return peak_rss//1024 if sys.platform=="darwin" else peak_rss
+
+def _measure(func, prepare, n_lines, repeat):
+    """ Best wall and CPU time of function over repeated runs on freshly prepared input. """
+    best_wall = best_cpu = None
+    baseline_rss = None
+    for _ in range(repeat):
+        data = prepare()
+        if baseline_rss is None:
+            baseline_rss = _peak_rss()
+        wall_begin, cpu_begin = time.time(), _process_time()
+        result = func(data)
+        wall, cpu = time.time()-wall_begin, _process_time()-cpu_begin
+        best_wall = wall if best_wall is None else min(best_wall, wall)
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+        lines = n_lines(data, result)
+        del data, result
+    # Peak RSS includes preparing input, so memory allocated by function itself is traced in a separate run
+    peak_rss = _peak_rss()
+    peak_alloc = None
+    if tracemalloc is not None:
+        data = prepare()
+        tracemalloc.start()
+        try:
+            result = func(data)
+            peak_alloc = tracemalloc.get_traced_memory()[1]//1024
+        finally:
+            tracemalloc.stop()
+        del data, result
+    return {
+        "lines": lines,
+        "wall_seconds": best_wall,
+        "cpu_seconds": best_cpu,
+        "lines_per_sec": lines/best_wall if best_wall else None,
+        "baseline_peak_rss_kib": baseline_rss,
+        "peak_rss_kib": peak_rss,
+        "peak_alloc_kib": peak_alloc
+    }
+
+def run_stage(stage_name, log_path, repeat):
+    """ Benchmark a single pipeline stage on output of preceding stages. """
+    stage_idx = _STAGE_NAMES.index(stage_name)
+    _, stage_func, n_lines = _STAGES[stage_idx]
+    def prepare():
+        data = log_path
+        for _, func, _ in _STAGES[:stage_idx]:
+            data = func(data)
+        return data
+    return _measure(stage_func, prepare, lambda data, result: n_lines(result), repeat)
+
+def run_end_to_end(bench_name, dataset_root, work_dir, jobs, repeat):
+    """ Benchmark training or detection dataset generation on generated log dataset. """
+    with open(os.path.join(dataset_root, "amount.json")) as f:
+        amount_map = json.load(f)
+    with open(os.path.join(dataset_root, "lines.json")) as f:
+        n_lines = json.load(f)
+    dataset_path = os.path.join(work_dir, "training-dataset")
+    def build_training_dataset():
+        np.random.seed(0)
+        training_dataset = gen_training_dataset(dataset_root, amount_map, _STAGE_LOG_FEATURES, jobs=jobs)
+        save_training_dataset(dataset_path, training_dataset)
+    if bench_name=="gen_training_dataset":
+        func = lambda _: build_training_dataset()
+        total_lines = sum(n_lines.values())
+    else:
+        # Training dataset of detection benchmark (Not timed)
+        if not os.path.exists(os.path.join(dataset_path, "meta.json")):
+            build_training_dataset()
+        vocabulary, log_features, hashing = load_vocabulary(dataset_path)
+        dataset_name = sorted(amount_map)[0]
+        def func(_):
+            gen_detection_dataset(
+                os.path.join(dataset_root, dataset_name),
+                vocabulary,
+                n_logs=amount_map[dataset_name],
+                log_features=log_features,
+                jobs=jobs,
+                hashing=hashing
+            )
+        total_lines = n_lines[dataset_name]
+    return _measure(func, lambda: None, lambda data, result: total_lines, repeat)
+
+def _run_child(args):
+    """ Run benchmark in a child process so that peak RSS is measured separately. """
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__)]+args)
+    return json.loads(output.decode("utf-8"))
+
+def main():
+    # CLI arguments
+    parser = ArgumentParser(description="SLI pipeline benchmarks")
+    parser.add_argument(
+        "-o", "--output",
+        default="-",
+        help="Output JSON result file path"
+    )
+    parser.add_argument(
+        "-l", "--lines",
+        default=200000,
+        type=int,
+        help="Number of lines of stage benchmark log"
+    )
+    parser.add_argument(
+        "-n", "--log-amount-map",
+        default="{\"attack\": 4, \"normal\": 4}",
+        help="JSON map of log amount of each log category of end-to-end benchmarks"
+    )
+    parser.add_argument(
+        "--log-lines",
+        default=50000,
+        type=int,
+        help="Number of lines in each log of end-to-end benchmarks"
+    )
+    parser.add_argument(
+        "-r", "--repeat",
+        default=3,
+        type=int,
+        help="Number of runs of each benchmark (Best run is reported)"
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        default=1,
+        type=int,
+        help="Number of worker processes of end-to-end benchmarks"
+    )
+    parser.add_argument(
+        "-b", "--benchmarks",
+        default=",".join(_STAGE_NAMES+["gen_training_dataset", "gen_detection_dataset"]),
+        help="Comma-separated benchmarks to run"
+    )
+    parser.add_argument(
+        "-w", "--work-dir",
+        default=None,
+        help="Directory for generated logs (Temporary directory by default)"
+    )
+    add_generator_arguments(parser)
+    # Internal options of child process
+    parser.add_argument("--child-benchmark", default=None, help=SUPPRESS)
+    parser.add_argument("--child-input", default=None, help=SUPPRESS)
+    # Parse arguments
+    cli_args = parser.parse_args()
+    # Child process
+    if cli_args.child_benchmark:
+        if cli_args.child_benchmark in _STAGE_NAMES:
+            result = run_stage(cli_args.child_benchmark, cli_args.child_input, cli_args.repeat)
+        else:
+            result = run_end_to_end(
+                cli_args.child_benchmark,
+                cli_args.child_input,
+                cli_args.work_dir,
+                cli_args.jobs,
+                cli_args.repeat
+            )
+        print(json.dumps(result))
+        return 0
+    benchmarks = cli_args.benchmarks.split(",")
+    options = generator_options(cli_args)
+    amount_map = json.loads(cli_args.log_amount_map)
+    # Working directory
+    work_dir = cli_args.work_dir or tempfile.mkdtemp(prefix="sli-bench-")
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+    try:
+        # Generate logs
+        log_path = os.path.join(work_dir, "stage-log.txt")
+        LogGenerator(seed=cli_args.seed, **options).write_log(log_path, cli_args.lines)
+        dataset_root = os.path.join(work_dir, "logs")
+        n_lines = write_log_dataset(dataset_root, amount_map, cli_args.log_lines, cli_args.seed, **options)
+        with open(os.path.join(dataset_root, "lines.json"), "w") as f:
+            json.dump(n_lines, f)
+        # Run benchmarks
+        results = {}
+        child_args = ["--repeat", str(cli_args.repeat), "--jobs", str(cli_args.jobs), "--work-dir", work_dir]
+        for bench_name in benchmarks:
+            child_input = log_path if bench_name in _STAGE_NAMES else dataset_root
+            results[bench_name] = _run_child(
+                child_args+["--child-benchmark", bench_name, "--child-input", child_input]
+            )
+            print("{}: {:.0f} lines/sec".format(bench_name, results[bench_name]["lines_per_sec"] or 0),
+                file=sys.stderr)
+    finally:
+        if not cli_args.work_dir:
+            shutil.rmtree(work_dir)
+    # Benchmark report
+    report = {
+        "config": {
+            "seed": cli_args.seed,
+            "lines": cli_args.lines,
+            "log_amount_map": amount_map,
+            "log_lines": cli_args.log_lines,
+            "repeat": cli_args.repeat,
+            "jobs": cli_args.jobs,
+            "generator": options
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "numpy": np.__version__
+        },
+        "results": results
+    }
+    report_str = json.dumps(report, indent=2, sort_keys=True)
+    if cli_args.output=="-":
+        print(report_str)
+    else:
+        with open(cli_args.output, "w") as f:
+            f.write(report_str+"\n")
+    return 0
+
+if __name__=="__main__":
+    exit(main())
@@ -12,13 +12,19 @@ setup(
     packages=["sli"],
     scripts=[
         "sli-gen-training",
-        "sli-gen-detection"
+        "sli-gen-detection",
+        "sli-export-model",
+        "sli-convert-dataset",
+        "sli-convert-log",
+        "sli-replay-logs"
     ],
     install_requires=[
         "numpy",
         "scipy",
-        "six",
-        "namedlist",
-        "tensorflow"
-    ]
+        "six"
+    ],
+    extras_require={
+        "zstd": ["zstandard"],
+        "tensorflow": ["tensorflow"]
+    }
 )
@@ -0,0 +1,219 @@
+from __future__ import unicode_literals, division
+import os, hashlib, logging
+from six import iteritems
+from six.moves import range
+import numpy as np
+
+from .types import LogLine, OptArg, SyscallErrorArg, FdArg
+from .parser import parse_lines_fused, event_wanted_args
+from .processing import lines_from_file, detect_log_format
+from .dataset import write_file_atomic
+
+# Logger
+_logger = logging.getLogger(__name__)
+
+# Cache entry format version
+CACHE_VERSION = 1
+
+# Column data types
+_COLUMN_DTYPES = {
+    "evt_num": np.int64,
+    "evt_time": np.int64,
+    "evt_cpu": np.int32,
+    "proc_name": np.int32,
+    "thread_tid": np.int64,
+    "evt_dir": np.int32,
+    "evt_type": np.int32,
+    "fd_kind": np.int8,
+    "fd_val": np.int64,
+    "fd_str": np.int32,
+    "fd_location": np.int32,
+    "opt_indptr": np.int64,
+    "opt_name": np.int32,
+    "opt_value": np.int64,
+    "opt_options": np.int32
+}
+
+# File descriptor argument kinds
+_FD_NONE = 0
+_FD_ARG = 1
+_FD_SYSCALL_ERROR = 2
+
+def _pack_strings(strings):
+    """ Pack string table into UTF-8 bytes and character offsets. """
+    joined = "".join(strings)
+    offsets = np.cumsum([0]+[len(string) for string in strings], dtype=np.int64)
+    return np.frombuffer(joined.encode("utf-8"), dtype=np.uint8), offsets
+
+def _unpack_strings(data, offsets):
+    """ Unpack string table from UTF-8 bytes and character offsets. """
+    joined = data.tobytes().decode("utf-8")
+    offsets = offsets.tolist()
+    return [joined[offsets[i]:offsets[i+1]] for i in range(len(offsets)-1)]
+
+class ParsedLogCache(object):
+    def __init__(self, cache_dir, max_size=1<<30, event_opt_args={}):
+        """ Initialize on-disk cache of parsed logs. """
+        ## Cache directory
+        self.cache_dir = cache_dir
+        ## Maximum total size of cache entries in bytes
+        self.max_size = max_size
+        ## Option arguments of each event to parse and cache
+        self.event_opt_args = event_opt_args
+    def _entry_path(self, file_path):
+        """ Cache entry path for log file (Keyed by path, size and modification time). """
+        stat = os.stat(file_path)
+        key = repr((
+            CACHE_VERSION,
+            os.path.abspath(file_path),
+            stat.st_size,
+            getattr(stat, "st_mtime_ns", stat.st_mtime),
+            sorted((evt, sorted(opt_args)) for evt, opt_args in iteritems(self.event_opt_args))
+        ))
+        key_hash = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key_hash+".npz")
+    def _encode(self, lines):
+        """ Encode parsed lines into columns with interned string table. """
+        strings = []
+        string_ids = {}
+        def intern_string(string):
+            string_id = string_ids.get(string)
+            if string_id is None:
+                string_id = string_ids[string] = len(strings)
+                strings.append(string)
+            return string_id
+        # Columns
+        columns = dict((name, []) for name in _COLUMN_DTYPES)
+        columns["opt_indptr"].append(0)
+        for line in lines:
+            columns["evt_num"].append(line.evt_num)
+            columns["evt_time"].append(line.evt_time)
+            columns["evt_cpu"].append(line.evt_cpu)
+            columns["proc_name"].append(intern_string(line.proc_name))
+            columns["thread_tid"].append(line.thread_tid)
+            columns["evt_dir"].append(intern_string(line.evt_dir))
+            columns["evt_type"].append(intern_string(line.evt_type))
+            # File descriptor argument
+            fd_arg = line.evt_args.get("fd")
+            if isinstance(fd_arg, FdArg):
+                fd_kind, fd_val = _FD_ARG, fd_arg.fd_val
+                fd_str, fd_location = intern_string(fd_arg.fd_type), intern_string(fd_arg.location)
+            elif isinstance(fd_arg, SyscallErrorArg):
+                fd_kind, fd_val = _FD_SYSCALL_ERROR, fd_arg.value
+                fd_str, fd_location = -1 if fd_arg.name is None else intern_string(fd_arg.name), -1
+            else:
+                fd_kind, fd_val, fd_str, fd_location = _FD_NONE, 0, -1, -1
+            columns["fd_kind"].append(fd_kind)
+            columns["fd_val"].append(fd_val)
+            columns["fd_str"].append(fd_str)
+            columns["fd_location"].append(fd_location)
+            # Option arguments
+            for arg_name in self.event_opt_args.get(line.evt_type, ()):
+                opt_arg = line.evt_args.get(arg_name)
+                if isinstance(opt_arg, OptArg):
+                    columns["opt_name"].append(intern_string(arg_name))
+                    columns["opt_value"].append(opt_arg.value)
+                    columns["opt_options"].append(intern_string("|".join(opt_arg.options)))
+            columns["opt_indptr"].append(len(columns["opt_name"]))
+        # Convert columns to arrays
+        columns = dict((
+            (name, np.array(column, dtype=_COLUMN_DTYPES[name])) for name, column in iteritems(columns)
+        ))
+        columns["strings_data"], columns["strings_offsets"] = _pack_strings(strings)
+        return columns
+    def _decode(self, columns):
+        """ Decode columns into parsed lines. """
+        strings = _unpack_strings(columns["strings_data"], columns["strings_offsets"])
+        columns = dict((name, column.tolist()) for name, column in iteritems(columns))
+        opt_indptr = columns["opt_indptr"]
+        for i in range(len(columns["evt_num"])):
+            evt_args = {}
+            # File descriptor argument
+            fd_kind = columns["fd_kind"][i]
+            if fd_kind==_FD_ARG:
+                evt_args["fd"] = FdArg(
+                    fd_val=columns["fd_val"][i],
+                    fd_type=strings[columns["fd_str"][i]],
+                    location=strings[columns["fd_location"][i]]
+                )
+            elif fd_kind==_FD_SYSCALL_ERROR:
+                fd_str = columns["fd_str"][i]
+                evt_args["fd"] = SyscallErrorArg(
+                    value=columns["fd_val"][i],
+                    name=None if fd_str<0 else strings[fd_str]
+                )
+            # Option arguments
+            for j in range(opt_indptr[i], opt_indptr[i+1]):
+                evt_args[strings[columns["opt_name"][j]]] = OptArg(
+                    value=columns["opt_value"][j],
+                    options=strings[columns["opt_options"][j]].split("|")
+                )
+            yield LogLine(
+                evt_num=columns["evt_num"][i],
+                evt_time=columns["evt_time"][i],
+                evt_cpu=columns["evt_cpu"][i],
+                proc_name=strings[columns["proc_name"][i]],
+                thread_tid=columns["thread_tid"][i],
+                evt_dir=strings[columns["evt_dir"][i]],
+                evt_type=strings[columns["evt_type"][i]],
+                evt_args=evt_args
+            )
+    def _evict(self):
+        """ Remove least recently used entries until cache fits in maximum size. """
+        entries = []
+        for entry_name in os.listdir(self.cache_dir):
+            if not entry_name.endswith(".npz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, entry_name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_name))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_name in sorted(entries):
+            if total_size<=self.max_size:
+                break
+            try:
+                os.unlink(os.path.join(self.cache_dir, entry_name))
+            except OSError:
+                pass
+            total_size -= size
+            _logger.debug("[Cache] Evicted entry %s", entry_name)
+    def lines(self, file_path, rebuild=False):
+        """ Read parsed lines of log file from cache, building the entry on cache miss.
+            Returns None if the log cannot be parsed and cached. """
+        entry_path = self._entry_path(file_path)
+        # Load cache entry
+        if not rebuild:
+            try:
+                with np.load(entry_path) as entry:
+                    columns = dict(entry)
+                # Mark entry as recently used
+                os.utime(entry_path, None)
+                _logger.debug("[Cache] Loaded parsed log %s", file_path)
+                return self._decode(columns)
+            except (IOError, OSError, ValueError):
+                pass
+        # Parse log and encode lines
+        wanted_args = event_wanted_args(["fd"], self.event_opt_args)
+        try:
+            columns = self._encode(parse_lines_fused(
+                wanted_args=wanted_args,
+                event_opt_args=self.event_opt_args,
+                fd_args=True,
+                log_format=detect_log_format(file_path)
+            )(lines_from_file(file_path)))
+        # Leave logs with unusual lines to the normal pipeline, which reports parsing errors
+        except (SyntaxError, ValueError, KeyError, IndexError) as e:
+            _logger.warning("[Cache] Bypassed cache for log %s, which cannot be parsed: %s", file_path, e)
+            return None
+        # Save cache entry
+        try:
+            os.makedirs(self.cache_dir)
+        except OSError:
+            if not os.path.isdir(self.cache_dir):
+                raise
+        write_file_atomic(entry_path, lambda f: np.savez_compressed(f, **columns))
+        _logger.debug("[Cache] Saved parsed log %s", file_path)
+        self._evict()
+        return self._decode(columns)
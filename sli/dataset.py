@@ -0,0 +1,234 @@
+from __future__ import unicode_literals, division
+import os, json, tempfile
+from six import iteritems
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from .processing import Vocabulary
+
+# Dataset directory format name and version
+DATASET_FORMAT = "sli-dataset"
+DATASET_FORMAT_VERSION = 1
+# Training dataset parts
+DATASET_PARTS = ("train", "validate", "test")
+
+# Process umask (Read once, since it can only be read by setting it)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+# Rename replacing existing file on all platforms (Python 3 only)
+_replace_file = getattr(os, "replace", os.rename)
+
+def write_file_atomic(path, write_func):
+    """ Write file through a temporary file so that incomplete files are never visible. """
+    # Unique temporary file in the same directory, so concurrent writers do not collide
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".",
+        prefix=os.path.basename(path)+".",
+        suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write_func(f)
+        # Temporary files are only accessible by owner; use permissions of normally created files
+        os.chmod(tmp_path, 0o666&~_UMASK)
+        _replace_file(tmp_path, path)
+    finally:
+        # Remove temporary file of failed write
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+def save_counts_shard(path, log_file_datum, labels):
+    """ Save process-event-feature (Or column) counts, lines counts and labels of logs to a shard file. """
+    indptr = [0]
+    lines_counts = []
+    keys = []
+    counts = []
+    for proc_evt_feature_count, lines_count in log_file_datum:
+        for key, count in iteritems(proc_evt_feature_count):
+            keys.append(key)
+            counts.append(count)
+        indptr.append(len(counts))
+        lines_counts.append(lines_count)
+    arrays = {
+        "labels": np.array(labels, dtype=np.int64),
+        "lines_counts": np.array(lines_counts, dtype=np.int64),
+        "indptr": np.array(indptr, dtype=np.int64),
+        "counts": np.array(counts, dtype=np.int64)
+    }
+    # Lines counted by column
+    if keys and not isinstance(keys[0], tuple):
+        arrays["columns"] = np.array(keys, dtype=np.int64)
+    else:
+        arrays["proc_names"] = np.array([process_name for process_name, _ in keys])
+        arrays["evt_features"] = np.array([
+            json.dumps(list(evt_feature_tuple)) for _, evt_feature_tuple in keys
+        ])
+    # Write shard file
+    write_file_atomic(path, lambda f: np.savez_compressed(f, **arrays))
+
+def load_counts_shard(path):
+    """ Load process-event-feature (Or column) counts, lines counts and labels of logs from a shard file. """
+    with np.load(path) as shard:
+        indptr = shard["indptr"]
+        if "columns" in shard:
+            keys = shard["columns"].tolist()
+        else:
+            keys = list(zip(
+                shard["proc_names"].tolist(),
+                [tuple(json.loads(item)) for item in shard["evt_features"].tolist()]
+            ))
+        counts = shard["counts"].tolist()
+        log_file_datum = []
+        for i, lines_count in enumerate(shard["lines_counts"].tolist()):
+            begin, end = indptr[i], indptr[i+1]
+            proc_evt_feature_count = dict(zip(keys[begin:end], counts[begin:end]))
+            log_file_datum.append((proc_evt_feature_count, lines_count))
+        return log_file_datum, shard["labels"].tolist()
+
+def shard_path(work_dir, part_name, i):
+    """ Path of a shard file in working directory. """
+    return os.path.join(work_dir, "{}-{:05d}.npz".format(part_name, i))
+
+def load_manifest(work_dir):
+    """ Load working directory manifest (None if it does not exist). """
+    manifest_path = os.path.join(work_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(work_dir, manifest):
+    """ Save working directory manifest. """
+    manifest_path = os.path.join(work_dir, "manifest.json")
+    write_file_atomic(manifest_path, lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+
+def _write_json_atomic(path, obj):
+    """ Write JSON file through a temporary file. """
+    write_file_atomic(path, lambda f: f.write(json.dumps(obj).encode("utf-8")))
+
+def _read_json(path):
+    """ Read JSON file. """
+    with open(path, "rb") as f:
+        return json.loads(f.read().decode("utf-8"))
+
+def _part_array_path(path, part_name, array_name):
+    """ Path of an array file of a dataset part. """
+    return os.path.join(path, "{}-{}.npy".format(part_name, array_name))
+
+def is_dataset_dir(path):
+    """ Check if path is a dataset directory (Instead of a legacy dataset file). """
+    return os.path.isdir(path)
+
+def save_training_dataset(path, training_dataset):
+    """ Save training dataset tuple to dataset directory. Metadata file is removed first and written last,
+        so incomplete (Or partially overwritten) dataset directories cannot be opened. """
+    x_train, labels_train, x_validate, labels_validate, x_test, labels_test, dataset_names, \
+        processes, evt_feature_tuples, log_features = training_dataset[:10]
+    hashing = training_dataset[10] if len(training_dataset)>10 else {}
+    if not os.path.exists(path):
+        os.makedirs(path)
+    # Invalidate existing dataset before its arrays are replaced
+    meta_path = os.path.join(path, "meta.json")
+    if os.path.exists(meta_path):
+        os.unlink(meta_path)
+    # Raw CSR arrays and labels of each part
+    parts = {}
+    for part_name, x, labels in zip(
+        DATASET_PARTS,
+        (x_train, x_validate, x_test),
+        (labels_train, labels_validate, labels_test)
+    ):
+        x = csr_matrix(x)
+        for array_name, array in (
+            ("data", x.data),
+            ("indices", x.indices),
+            ("indptr", x.indptr),
+            ("labels", np.asarray(labels, dtype=float))
+        ):
+            write_file_atomic(
+                _part_array_path(path, part_name, array_name),
+                lambda f: np.save(f, array)
+            )
+        parts[part_name] = {"shape": list(x.shape), "nnz": int(x.nnz)}
+    # Vocabulary
+    _write_json_atomic(os.path.join(path, "vocabulary.json"), {
+        "processes": list(processes),
+        "evt_feature_tuples": [list(evt_feature_tuple) for evt_feature_tuple in evt_feature_tuples]
+    })
+    # Metadata
+    _write_json_atomic(meta_path, {
+        "format": DATASET_FORMAT,
+        "version": DATASET_FORMAT_VERSION,
+        "parts": parts,
+        "dataset_names": list(dataset_names),
+        "log_features": list(log_features),
+        "hashing": dict(hashing)
+    })
+
+def load_dataset_meta(path):
+    """ Load metadata of dataset directory. """
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        raise ValueError("{} is not a complete dataset directory".format(path))
+    meta = _read_json(meta_path)
+    if meta.get("format")!=DATASET_FORMAT:
+        raise ValueError("{} is not a dataset directory".format(path))
+    if meta["version"]>DATASET_FORMAT_VERSION:
+        raise ValueError("Unsupported dataset format version {} of {}".format(meta["version"], path))
+    return meta
+
+def load_legacy_dataset(path):
+    """ Load training dataset tuple from legacy pickled dataset file. """
+    return tuple(np.load(path, allow_pickle=True))
+
+def load_vocabulary(path):
+    """ Load vocabulary, log features and feature hashing parameters of a training dataset, without
+        loading any of its parts. """
+    # Legacy dataset file
+    if not is_dataset_dir(path):
+        dataset = load_legacy_dataset(path)
+        return Vocabulary(dataset[7], dataset[8]), list(dataset[9]), dataset[10] if len(dataset)>10 else {}
+    meta = load_dataset_meta(path)
+    vocabulary = _read_json(os.path.join(path, "vocabulary.json"))
+    return Vocabulary(vocabulary["processes"], vocabulary["evt_feature_tuples"]), \
+        meta["log_features"], \
+        meta["hashing"]
+
+def load_dataset_part(path, part_name, mmap=True):
+    """ Load frequency matrix and labels of a training dataset part (Arrays are memory-mapped by
+        default). """
+    # Legacy dataset file
+    if not is_dataset_dir(path):
+        i = DATASET_PARTS.index(part_name)*2
+        dataset = load_legacy_dataset(path)
+        return dataset[i], dataset[i+1]
+    meta = load_dataset_meta(path)
+    mmap_mode = "r" if mmap else None
+    data, indices, indptr, labels = (
+        np.load(_part_array_path(path, part_name, array_name), mmap_mode=mmap_mode)
+        for array_name in ("data", "indices", "indptr", "labels")
+    )
+    x = csr_matrix((data, indices, indptr), shape=tuple(meta["parts"][part_name]["shape"]), copy=False)
+    return x, labels
+
+def load_training_dataset(path, mmap=True):
+    """ Load training dataset tuple from dataset directory or legacy dataset file. """
+    # Legacy dataset file
+    if not is_dataset_dir(path):
+        return load_legacy_dataset(path)
+    meta = load_dataset_meta(path)
+    vocabulary, log_features, hashing = load_vocabulary(path)
+    training_dataset = ()
+    for part_name in DATASET_PARTS:
+        training_dataset += load_dataset_part(path, part_name, mmap)
+    return training_dataset+(
+        meta["dataset_names"],
+        vocabulary.processes,
+        vocabulary.evt_feature_tuples,
+        log_features,
+        hashing
+    )
+
+def convert_legacy_dataset(legacy_path, path):
+    """ Convert legacy pickled dataset file to dataset directory. """
+    save_training_dataset(path, load_legacy_dataset(legacy_path))
@@ -0,0 +1,156 @@
+from __future__ import unicode_literals, division
+import numpy as np
+import scipy.sparse
+from six.moves import range
+
+# Input tensor name of Tensorflow model
+TF_INPUT_TENSOR = "input_X:0"
+# Training flag tensor name of Tensorflow model
+TF_TRAINING_TENSOR = "training:0"
+# Default output layer of Tensorflow model
+DEFAULT_OUTPUT_LAYER = "dense_layer_5"
+
+# Activation functions
+_ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1/(1+np.exp(-x)),
+    "tanh": np.tanh,
+    "elu": lambda x: np.where(x>0, x, np.expm1(x)),
+    "selu": lambda x: 1.0507009873554805*np.where(x>0, x, 1.6732632423543772*np.expm1(x)),
+    "softplus": lambda x: np.logaddexp(0, x)
+}
+# Tensorflow activation operation types
+_TF_ACTIVATION_OPS = {
+    "Relu": "relu",
+    "Sigmoid": "sigmoid",
+    "Tanh": "tanh",
+    "Elu": "elu",
+    "Selu": "selu",
+    "Softplus": "softplus"
+}
+
+def softmax(x):
+    """ Row-wise softmax. """
+    exp_x = np.exp(x-x.max(axis=1, keepdims=True))
+    return exp_x/exp_x.sum(axis=1, keepdims=True)
+
+def restore_tf_session(model_path):
+    """ Restore Tensorflow model checkpoint into a new session. """
+    import tensorflow as tf
+    session = tf.Session(graph=tf.Graph())
+    with session.graph.as_default():
+        graph_saver = tf.train.import_meta_graph(model_path+".meta")
+        graph_saver.restore(session, model_path)
+    return session
+
+def _cond_passthrough_input(merge_op):
+    """ Input of conditional merge operation passed through unchanged (Inference branch of dropout). """
+    for tensor in merge_op.inputs:
+        op = tensor.op
+        while op.type=="Identity":
+            op = op.inputs[0].op
+        if op.type=="Switch":
+            return op.inputs[0]
+    raise ValueError("Unsupported conditional operation {} in model".format(merge_op.name))
+
+def _tf_dense_layers(session, output_tensor):
+    """ Walk Tensorflow graph from output tensor back to input and collect dense layers. """
+    layers = []
+    activation = None
+    tensor = output_tensor
+    while tensor.op.type!="Placeholder":
+        op = tensor.op
+        # Pass-through operations
+        if op.type in ("Identity", "StopGradient"):
+            tensor = op.inputs[0]
+        # Dropout is a pass-through at inference time
+        elif op.type=="Merge":
+            tensor = _cond_passthrough_input(op)
+        # Activation of previous dense layer
+        elif op.type in _TF_ACTIVATION_OPS:
+            if activation is not None:
+                raise ValueError("Unsupported stacked activation {} in model".format(op.name))
+            activation = _TF_ACTIVATION_OPS[op.type]
+            tensor = op.inputs[0]
+        # Dense layer
+        elif op.type=="BiasAdd":
+            matmul_op = op.inputs[0].op
+            if matmul_op.type!="MatMul" or matmul_op.get_attr("transpose_a") \
+                or matmul_op.get_attr("transpose_b"):
+                raise ValueError("Unsupported dense layer {} in model".format(op.name))
+            kernel, bias = session.run([matmul_op.inputs[1], op.inputs[1]])
+            layers.append((kernel, bias, activation or "linear"))
+            activation = None
+            tensor = matmul_op.inputs[0]
+        else:
+            raise ValueError("Unsupported operation {} ({}) in model".format(op.name, op.type))
+    if activation is not None:
+        raise ValueError("Unsupported activation on model input")
+    layers.reverse()
+    return layers
+
+def export_dense_layers(model_path, output_path, output_layer=DEFAULT_OUTPUT_LAYER):
+    """ Export dense layers of Tensorflow model up to output layer into NumPy archive. """
+    session = restore_tf_session(model_path)
+    output_tensor = session.graph.get_tensor_by_name(output_layer+"/BiasAdd:0")
+    layers = _tf_dense_layers(session, output_tensor)
+    # Layer weights and activations
+    arrays = {"activations": np.array([activation for _, _, activation in layers])}
+    for i, (kernel, bias, _) in enumerate(layers):
+        arrays["kernel_{}".format(i)] = kernel
+        arrays["bias_{}".format(i)] = bias
+    with open(output_path, "wb") as f:
+        np.savez(f, **arrays)
+    return len(layers)
+
+class DenseClassifier(object):
+    def __init__(self, layers):
+        """ Initialize NumPy classifier from kernel, bias and activation of each dense layer. """
+        ## Kernel, bias and activation name of each dense layer
+        self.layers = layers
+    @classmethod
+    def load(cls, path):
+        """ Load classifier from exported NumPy archive. """
+        with np.load(path) as model:
+            activations = model["activations"].tolist()
+            return cls([
+                (model["kernel_{}".format(i)], model["bias_{}".format(i)], activations[i])
+                for i in range(len(activations))
+            ])
+    def predict_proba(self, x):
+        """ Class probabilities of each row of dense or sparse detection data. """
+        x = x.astype(np.float32)
+        for kernel, bias, activation in self.layers:
+            # Sparse product yields dense result
+            x = _ACTIVATIONS[activation](np.asarray(x.dot(kernel))+bias)
+        return softmax(x)
+
+class TFClassifier(object):
+    def __init__(self, model_path, output_layer=DEFAULT_OUTPUT_LAYER):
+        """ Initialize classifier from Tensorflow model checkpoint. """
+        import tensorflow as tf
+        ## Tensorflow session
+        self.session = restore_tf_session(model_path)
+        graph = self.session.graph
+        ## Input tensor
+        self.input_tensor = graph.get_tensor_by_name(TF_INPUT_TENSOR)
+        ## Training flag tensor
+        self.training_tensor = graph.get_tensor_by_name(TF_TRAINING_TENSOR)
+        ## Softmax of output layer
+        with graph.as_default():
+            self.softmax = tf.nn.softmax(graph.get_tensor_by_name(output_layer+"/BiasAdd:0"))
+    def predict_proba(self, x):
+        """ Class probabilities of each row of dense or sparse detection data. """
+        if scipy.sparse.issparse(x):
+            x = x.toarray()
+        return self.session.run(self.softmax, feed_dict={
+            self.input_tensor: x.astype(np.float32),
+            self.training_tensor: False
+        })
+
+def load_classifier(model_path):
+    """ Load exported NumPy classifier (".npz" file) or Tensorflow model checkpoint. """
+    if model_path.endswith(".npz"):
+        return DenseClassifier.load(model_path)
+    return TFClassifier(model_path)
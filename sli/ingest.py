@@ -0,0 +1,344 @@
+from __future__ import unicode_literals, division
+import time, asyncio, logging, itertools, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import scipy.sparse
+
+from sli.pipeline import parse_passes, feature_generators
+from sli.processing import FreqCounter, SlidingWindowCounter, compose_passes, lines_from_stream, \
+    lines_from_file, detect_line_format
+
+# Logger
+_logger = logging.getLogger(__name__)
+
+# Default size of blocks read from source connections (64 KiB)
+DEFAULT_READ_SIZE = 1<<16
+# Default maximum amount of windows waiting for classification
+DEFAULT_MAX_PENDING = 1024
+# Default maximum amount of windows in a batch
+DEFAULT_BATCH_SIZE = 64
+# Header line naming a source (Sent before log lines, optional)
+SOURCE_HEADER = "#sli-source "
+
+def parse_address(address):
+    """ Parse "HOST:PORT" TCP address or "unix:PATH" Unix socket address into (Family, address) pair. """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError("Invalid address {} (Expected HOST:PORT or unix:PATH)".format(address))
+    return "tcp", (host.strip("[]"), int(port))
+
+class _SourceWindows(object):
+    def __init__(self, vocabulary, log_features, hashing, window, hop, pipeline_options):
+        """ Initialize parsing passes and sliding window counter of a source. """
+        ## Frequency counter
+        self.freq_counter = FreqCounter(
+            feature_generators=feature_generators(log_features),
+            vocabulary=vocabulary,
+            **hashing
+        )
+        ## Sliding window counter
+        self.window_counter = SlidingWindowCounter(self.freq_counter, int(window*(10**9)), int(hop*(10**9)))
+        ## Log features
+        self.log_features = log_features
+        ## Pipeline options
+        self.pipeline_options = pipeline_options
+        ## Filtering and parsing passes (Built for log format detected from first line)
+        self.passes = None
+    def process_lines(self, raw_lines, flush=False):
+        """ Process raw lines continuing the stream, and return end times and detection data of completed
+            windows (And the last window if flushing). """
+        if self.passes is None:
+            if not raw_lines and not flush:
+                return [], None
+            # Lines are processed one by one
+            pipeline_options = dict(self.pipeline_options, chunk_size=0)
+            if raw_lines and "log_format" not in pipeline_options:
+                pipeline_options["log_format"] = detect_line_format(raw_lines[0])
+            self.passes = parse_passes(self.log_features, **pipeline_options)
+        windows = list(compose_passes(
+            raw_lines,
+            *(self.passes+[self.window_counter.process_lines(flush=flush)])
+        ))
+        if not windows:
+            return [], None
+        detection_data = self.freq_counter.freq_matrix(
+            (proc_evt_feature_count, lines_count) for _, proc_evt_feature_count, lines_count in windows
+        )
+        return [window_end for window_end, _, _ in windows], detection_data
+
+# Parser process context
+_parser_context = {}
+
+def _init_parser(vocabulary, log_features, hashing, window, hop, pipeline_options):
+    """ Initialize window parameters of parser process, which keeps sliding windows of its sources. """
+    _parser_context["windows_args"] = (vocabulary, log_features, hashing, window, hop, pipeline_options)
+    _parser_context["sources"] = {}
+
+def _process_source_lines(source_id, raw_lines, flush):
+    """ Process raw lines of a source in parser process (Sliding windows are dropped once flushed). """
+    sources = _parser_context["sources"]
+    windows = sources.get(source_id)
+    if windows is None:
+        windows = sources[source_id] = _SourceWindows(*_parser_context["windows_args"])
+    try:
+        return windows.process_lines(raw_lines, flush)
+    finally:
+        if flush:
+            del sources[source_id]
+
+def _drop_source(source_id):
+    """ Drop sliding windows of a disconnected source in parser process. """
+    _parser_context["sources"].pop(source_id, None)
+
+class IngestServer(object):
+    def __init__(self, vocabulary, classify, report, log_features=[], hashing={}, window=10.0, hop=1.0,
+        n_classifiers=1, batch_size=DEFAULT_BATCH_SIZE, max_pending=DEFAULT_MAX_PENDING, n_parsers=0,
+        pipeline_options={}):
+        """ Initialize ingestion server of Sysdig text streams. Blocks of each source are parsed in one of
+            given amount of parser processes (Or in threads if zero), windows of all sources are classified
+            in batches by blocking classify function (Run in threads), and each result is passed to report
+            function with source name and window end time. """
+        ## Vocabulary of training dataset
+        self.vocabulary = vocabulary
+        ## Batch classification function
+        self.classify = classify
+        ## Result report function
+        self.report = report
+        ## Log features
+        self.log_features = log_features
+        ## Feature hashing parameters
+        self.hashing = hashing
+        ## Sliding window length and hop in seconds
+        self.window = window
+        self.hop = hop
+        ## Maximum amount of batches being classified
+        self.n_classifiers = n_classifiers
+        ## Maximum amount of windows in a batch
+        self.batch_size = batch_size
+        ## Maximum amount of windows waiting for classification (Sources stop being read when reached)
+        self.max_pending = max_pending
+        ## Amount of parser processes (Zero for parsing in threads)
+        self.n_parsers = n_parsers
+        ## Pipeline options
+        self.pipeline_options = pipeline_options
+        ## Amount of windows classified
+        self.n_windows = 0
+        # Listening servers
+        self._servers = []
+        # Source connection tasks
+        self._source_tasks = set()
+        # Batch classification tasks
+        self._batch_tasks = set()
+        # Windows waiting for classification
+        self._queue = None
+        # Free classification slots
+        self._slots = None
+        # Batching task
+        self._batcher = None
+        # Numbers of unnamed Unix socket sources
+        self._source_ids = itertools.count(1)
+        # Parser processes (Each source is parsed by a single process, which keeps its sliding windows)
+        self._parsers = []
+        # Numbers of source connections
+        self._connection_ids = itertools.count()
+    async def start(self, addresses):
+        """ Start listening on TCP or Unix socket addresses. """
+        self._queue = asyncio.Queue(self.max_pending)
+        self._slots = asyncio.Semaphore(self.n_classifiers)
+        self._batcher = asyncio.ensure_future(self._batch_windows())
+        # Parser processes are spawned, since forking while classification threads run may deadlock
+        mp_context = multiprocessing.get_context("spawn")
+        self._parsers = [
+            ProcessPoolExecutor(1, mp_context=mp_context, initializer=_init_parser, initargs=(
+                self.vocabulary,
+                self.log_features,
+                self.hashing,
+                self.window,
+                self.hop,
+                self.pipeline_options
+            ))
+            for _ in range(self.n_parsers)
+        ]
+        for address in addresses:
+            family, addr = parse_address(address)
+            if family=="unix":
+                server = await asyncio.start_unix_server(self._handle_source, addr)
+            else:
+                server = await asyncio.start_server(self._handle_source, *addr)
+            self._servers.append(server)
+            _logger.info("[IngestServer] Listening on %s", address)
+    async def close(self):
+        """ Stop accepting sources, disconnect connected sources (Which may never end, like remote Sysdig
+            streams) and classify windows already queued. """
+        for server in self._servers:
+            server.close()
+        # Disconnect sources before waiting for servers, which may wait for all connections to close
+        for task in list(self._source_tasks):
+            task.cancel()
+        while self._source_tasks:
+            await asyncio.wait(list(self._source_tasks))
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+        await self.drain()
+        self._batcher.cancel()
+        for parser in self._parsers:
+            parser.shutdown()
+        self._parsers = []
+    async def drain(self):
+        """ Wait for connected sources to end by themselves and all their windows to be classified (For
+            replayed logs, which end at end of file). """
+        while self._source_tasks:
+            await asyncio.wait(list(self._source_tasks))
+        await self._queue.join()
+        while self._batch_tasks:
+            await asyncio.wait(list(self._batch_tasks))
+    def _source_name(self, writer):
+        """ Default name of a source connection (Peer address). """
+        peer = writer.get_extra_info("peername")
+        if isinstance(peer, tuple):
+            return "{}:{}".format(peer[0], peer[1])
+        return "unix-{}".format(next(self._source_ids))
+    async def _handle_source(self, reader, writer):
+        """ Serve a source connection. The source is read by a separate task, which is cancelled when the
+            server is closed (Cancelling connection callbacks themselves gets reported as an error). """
+        task = asyncio.ensure_future(self._read_source(reader, writer))
+        self._source_tasks.add(task)
+        task.add_done_callback(self._source_tasks.discard)
+        try:
+            await asyncio.wait([task])
+        finally:
+            task.cancel()
+    async def _read_source(self, reader, writer):
+        """ Read Sysdig text stream of a source, queueing detection data of its windows. """
+        source = self._source_name(writer)
+        connection_id = next(self._connection_ids)
+        loop = asyncio.get_event_loop()
+        # Parse in parser process of source, which keeps its sliding windows
+        if self._parsers:
+            parser = self._parsers[connection_id%len(self._parsers)]
+            process_lines = lambda raw_lines, flush: loop.run_in_executor(
+                parser, _process_source_lines, connection_id, raw_lines, flush
+            )
+        # Parse in threads
+        else:
+            parser = None
+            windows = _SourceWindows(
+                self.vocabulary,
+                self.log_features,
+                self.hashing,
+                self.window,
+                self.hop,
+                self.pipeline_options
+            )
+            process_lines = lambda raw_lines, flush: loop.run_in_executor(
+                None, windows.process_lines, raw_lines, flush
+            )
+        n_lines = 0
+        eof = False
+        remainder = b""
+        try:
+            while True:
+                block = await reader.read(DEFAULT_READ_SIZE)
+                eof = not block
+                # Process complete lines only (And last line without trailing newline at the end)
+                block = remainder+(b"\n" if eof else block)
+                split_pos = block.rfind(b"\n")+1
+                remainder = block[split_pos:]
+                raw_lines = list(lines_from_stream(block[:split_pos].decode("utf-8", "replace").split("\n")))
+                # Optional source name header
+                if raw_lines and n_lines==0 and raw_lines[0].startswith(SOURCE_HEADER):
+                    source = raw_lines.pop(0)[len(SOURCE_HEADER):].strip() or source
+                    _logger.info("[IngestServer] Source %s connected", source)
+                n_lines += len(raw_lines)
+                # Parse blocks outside event loop, so that other sources are served meanwhile
+                window_ends, detection_data = await process_lines(raw_lines, eof)
+                for i, window_end in enumerate(window_ends):
+                    # Stop reading source while classification falls behind
+                    await self._queue.put((time.time(), source, window_end, detection_data[i]))
+                if eof:
+                    break
+        except asyncio.CancelledError:
+            _logger.info("[IngestServer] Source %s disconnected by server", source)
+            raise
+        except Exception as e:
+            _logger.error("[IngestServer] Source %s failed: %s", source, e)
+        finally:
+            # Drop sliding windows of source not flushed (Runs after its pending block)
+            if parser is not None and not eof:
+                parser.submit(_drop_source, connection_id)
+            writer.close()
+            _logger.info("[IngestServer] Source %s ended after %d lines", source, n_lines)
+    async def _batch_windows(self):
+        """ Group queued windows into batches and classify them while a classification slot is free. """
+        while True:
+            batch = [await self._queue.get()]
+            await self._slots.acquire()
+            # Take windows queued while waiting for a free slot
+            while len(batch)<self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            task = asyncio.ensure_future(self._classify_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+    async def _classify_batch(self, batch):
+        """ Classify a batch of windows in a thread and report results. """
+        try:
+            detection_data = scipy.sparse.vstack([data for _, _, _, data in batch], format="csr")
+            results = await asyncio.get_event_loop().run_in_executor(None, self.classify, detection_data)
+            done_time = time.time()
+            queue_depth = self._queue.qsize()
+            for (submit_time, source, window_end, _), result in zip(batch, results):
+                _logger.debug(
+                    "[IngestServer] Window of %s ending at %.3fs: latency %.3fs, batch size %d, queue depth %d",
+                    source, window_end/(10**9), done_time-submit_time, len(batch), queue_depth
+                )
+                self.report(source, window_end, result)
+            self.n_windows += len(batch)
+        except Exception as e:
+            _logger.error("[IngestServer] Failed to classify %d windows: %s", len(batch), e)
+        finally:
+            self._slots.release()
+            for _ in batch:
+                self._queue.task_done()
+
+def _read_line_batch(lines, batch_lines):
+    """ Read a batch of lines and encode it as newline-terminated block (Empty at end of file). """
+    batch = list(itertools.islice(lines, batch_lines))
+    if not batch:
+        return 0, b""
+    return len(batch), ("\n".join(batch)+"\n").encode("utf-8")
+
+async def replay_log(log_path, address, source=None, rate=0.0, batch_lines=1024):
+    """ Replay recorded log file into ingestion server, optionally limited to given lines per second. Log
+        file is read in threads, so that logs replayed concurrently are read in parallel. """
+    family, addr = parse_address(address)
+    if family=="unix":
+        _, writer = await asyncio.open_unix_connection(addr)
+    else:
+        _, writer = await asyncio.open_connection(*addr)
+    n_lines = 0
+    begin = time.time()
+    try:
+        if source:
+            writer.write((SOURCE_HEADER+source+"\n").encode("utf-8"))
+        lines = lines_from_file(log_path)
+        loop = asyncio.get_event_loop()
+        while True:
+            n_batch_lines, block = await loop.run_in_executor(None, _read_line_batch, lines, batch_lines)
+            if not n_batch_lines:
+                break
+            writer.write(block)
+            # Wait while server is not reading (Backpressure)
+            await writer.drain()
+            n_lines += n_batch_lines
+            # Limit replay rate
+            if rate>0:
+                delay = begin+n_lines/rate-time.time()
+                if delay>0:
+                    await asyncio.sleep(delay)
+    finally:
+        writer.close()
+        # Wait for buffered lines to be sent
+        await writer.wait_closed()
+    return n_lines
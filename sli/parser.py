@@ -2,13 +2,24 @@ from __future__ import unicode_literals, division
 import re
 from six import iteritems
 
-from .types import LogLine, OptArg, SyscallErrorArg, FdArg
-from .processing import simple_pass
+from .types import LogLine, OptArg, SyscallErrorArg, FdArg, intern_string
+from .processing import simple_pass, TSV_HEADER, TSV_LOG_FORMAT, DEFAULT_LOG_FORMAT
 
 # Line string regular expression
 _LINE_REGEX = re.compile(r"(\d+) ([\d\.:]+) (\d+) ([^\(]+) \((\d+)\) ([\<\>]) ([^ ]+) ?(.*)?")
+# Line string with plain time format regular expression
+_PLAIN_TIME_LINE_REGEX = re.compile(
+    r"(\d+) (\d+):(\d+):(\d+)\.(\d+) (\d+) ([^\(]+) \((\d+)\) ([\<\>]) ([^ ]+) ?(.*)?"
+)
+# Lines with plain time format regular expression (Matches each line of newline-joined lines)
+_PLAIN_TIME_LINES_REGEX = re.compile(
+    r"^(\d+) (\d+):(\d+):(\d+)\.(\d+) (\d+) ([^\(\n]+) \((\d+)\) ([\<\>]) ([^ \n]+) ?(.*)$",
+    re.MULTILINE
+)
 # Time string regular expression
 _TIME_REGEX = re.compile(r"(\d+):(\d+):(\d+).(\d+)")
+# Nano seconds per day
+_NS_PER_DAY = 24*3600*(10**9)
 # Argument name regular expression
 _ARG_NAME_REGEX = re.compile(r"(\w+)(=| )(.*)")
 
@@ -27,9 +38,8 @@ def _parse_time(time_str):
     # Construct time in nano seconds
     return (h*3600+m*60+s)*(10**9)+ns
 
-@simple_pass
-def parse_line(raw_line):
-    """ Parse log line in Sysdig log. """
+def _parse_line(raw_line):
+    """ Parse log line in Sysdig log with regular expression. """
     # Parse log line with regular expression
     line_match = _LINE_REGEX.match(raw_line)
     if not line_match:
@@ -41,13 +51,75 @@ def parse_line(raw_line):
         evt_num=int(evt_num),
         evt_time=_parse_time(evt_time),
         evt_cpu=int(evt_cpu),
-        proc_name=proc_name,
+        proc_name=intern_string(proc_name),
         thread_tid=int(thread_tid),
-        evt_dir=evt_dir,
-        evt_type=evt_type,
+        evt_dir=intern_string(evt_dir),
+        evt_type=intern_string(evt_type),
         evt_args=evt_args
     )
 
+@simple_pass
+def parse_line(raw_line):
+    """ Parse log line in Sysdig log. """
+    return _parse_line(raw_line)
+
+def _parse_tsv_line(raw_line):
+    """ Parse tab-separated log line with a single split (None for header line). Event time is converted
+        to time of day like in default Sysdig log. """
+    if raw_line.startswith("#"):
+        return None
+    fields = raw_line.split("\t", 7)
+    # Empty arguments are removed with trailing characters of line
+    if len(fields)==7:
+        fields.append("")
+    elif len(fields)!=8:
+        raise SyntaxError("Unrecognized log line: {}".format(raw_line))
+    evt_num, evt_rawtime, evt_cpu, proc_name, thread_tid, evt_dir, evt_type, evt_args = fields
+    try:
+        return LogLine(
+            evt_num=int(evt_num),
+            evt_time=int(evt_rawtime)%_NS_PER_DAY,
+            evt_cpu=int(evt_cpu),
+            proc_name=intern_string(proc_name),
+            thread_tid=int(thread_tid),
+            evt_dir=intern_string(evt_dir),
+            evt_type=intern_string(evt_type),
+            evt_args=evt_args
+        )
+    except ValueError:
+        raise SyntaxError("Unrecognized log line: {}".format(raw_line))
+
+def parse_tsv_lines():
+    """ Parse lines of tab-separated Sysdig log, skipping header lines. """
+    # Pass generator function
+    def parse_tsv_lines_pass(raw_lines):
+        for raw_line in raw_lines:
+            line = _parse_tsv_line(raw_line)
+            if line is not None:
+                yield line
+    return parse_tsv_lines_pass
+
+def tsv_log_lines(raw_lines, day_begin=0):
+    """ Convert lines of default Sysdig log to tab-separated log lines, starting with header. Event times
+        of day are counted from given epoch nano seconds, continuing across midnight. """
+    yield TSV_HEADER
+    day_offset = day_begin
+    last_time = None
+    for raw_line in raw_lines:
+        line_match = _LINE_REGEX.match(raw_line)
+        if not line_match:
+            raise SyntaxError("Unrecognized log line: {}".format(raw_line))
+        evt_num, evt_time, evt_cpu, proc_name, thread_tid, evt_dir, evt_type, evt_args \
+            = line_match.groups()
+        evt_time = _parse_time(evt_time)
+        # Time of day wrapped around midnight
+        if last_time is not None and evt_time<last_time-_NS_PER_DAY//2:
+            day_offset += _NS_PER_DAY
+        last_time = evt_time
+        yield "\t".join((
+            evt_num, str(day_offset+evt_time), evt_cpu, proc_name, thread_tid, evt_dir, evt_type, evt_args or ""
+        ))
+
 def extract_arg_default(arg_str):
     """ Default strategy for extracting raw argument value. """
     args_str_split = arg_str.split(" ", 1)
@@ -78,14 +150,35 @@ ARG_EXTRACTORS_PRESET = {
     "name": extract_arg_until_line_end,
 }
 
-@simple_pass
-def parse_args_str(line, strict_parsing=False, arg_extractors=ARG_EXTRACTORS_PRESET):
-    """ Parse log line arguments string in Sysdig log. """
-    # Arguments string and dictionary
-    args_str = line.evt_args
+def event_wanted_args(common_args=(), event_args={}):
+    """ Wanted arguments of each event type, given arguments wanted for all events and arguments wanted for
+        specific events (Arguments of other events are stored under None key). """
+    common_args = frozenset(common_args)
+    wanted_args = dict(
+        (evt_type, common_args|frozenset(args)) for evt_type, args in iteritems(event_args)
+    )
+    wanted_args[None] = common_args
+    return wanted_args
+
+def _event_wanted_args(wanted_args):
+    """ Wanted arguments of each event type from wanted arguments of all events (None for all arguments). """
+    if wanted_args is None or isinstance(wanted_args, dict):
+        return wanted_args
+    return event_wanted_args(wanted_args)
+
+def _line_wanted_args(wanted_args, evt_type):
+    """ Wanted arguments of an event type (None for all arguments). """
+    if wanted_args is None:
+        return None
+    return wanted_args.get(evt_type, wanted_args[None])
+
+def _parse_args(args_str, strict_parsing, arg_extractors, wanted_args):
+    """ Parse arguments string into dictionary (Only arguments in wanted_args if given). """
     args_dict = {}
-    # Parse arguments string until it is empty
-    while args_str:
+    # Amount of wanted arguments not found yet (Negative for all arguments)
+    n_wanted = -1 if wanted_args is None else len(wanted_args)
+    # Parse arguments string until it is empty or all wanted arguments are found
+    while args_str and n_wanted:
         # Parse argument name
         next_arg_match = _ARG_NAME_REGEX.match(args_str)
         if not next_arg_match:
@@ -102,22 +195,31 @@ def parse_args_str(line, strict_parsing=False, arg_extractors=ARG_EXTRACTORS_PRE
             arg_raw_val, args_str = arg_extractor(args_str)
         else:
             arg_raw_val = None
+        # Skip unwanted argument
+        if wanted_args is not None:
+            if arg_name not in wanted_args:
+                continue
+            if arg_name not in args_dict:
+                n_wanted -= 1
         # Record argument name and raw value
         args_dict[arg_name] = arg_raw_val
+    return args_dict
+
+@simple_pass
+def parse_args_str(line, strict_parsing=False, arg_extractors=ARG_EXTRACTORS_PRESET, wanted_args=None):
+    """ Parse log line arguments string in Sysdig log (Only arguments in wanted_args if given, which are
+        argument names or wanted arguments of each event type). """
+    # Wanted arguments of event type
+    if isinstance(wanted_args, dict):
+        wanted_args = wanted_args.get(line.evt_type, wanted_args[None])
     # Replace arguments string by dictionary
-    line.evt_args = args_dict
+    line.evt_args = _parse_args(line.evt_args, strict_parsing, arg_extractors, wanted_args)
     return line
 
-@simple_pass
-def parse_option_args(line, event_opt_args={}):
-    """ Parse option arguments for log line. """
-    opt_args = event_opt_args.get(line.evt_type)
-    # Not event with optional arguments
-    if not opt_args:
-        return line
-    # Process each argument in line
+def _parse_option_args(args_dict, opt_args):
+    """ Parse option arguments in arguments dictionary. """
     opt_args_dict = {}
-    for arg_name, arg_raw_val in iteritems(line.evt_args):
+    for arg_name, arg_raw_val in iteritems(args_dict):
         # Not optional argument
         if arg_name not in opt_args:
             continue
@@ -132,16 +234,25 @@ def parse_option_args(line, event_opt_args={}):
             options=arg_opts_str.split("|")
         )
     # Replace optional arguments
-    line.evt_args.update(opt_args_dict)
-    return line
+    args_dict.update(opt_args_dict)
 
 @simple_pass
-def parse_fd_args(line):
-    """ Parse file descriptor arguments for log line. """
-    arg_raw_val = line.evt_args.get("fd")
+def parse_option_args(line, event_opt_args={}):
+    """ Parse option arguments for log line. """
+    opt_args = event_opt_args.get(line.evt_type)
+    # Not event with optional arguments
+    if not opt_args:
+        return line
+    # Process each argument in line
+    _parse_option_args(line.evt_args, opt_args)
+    return line
+
+def _parse_fd_arg(args_dict):
+    """ Parse file descriptor argument in arguments dictionary. """
+    arg_raw_val = args_dict.get("fd")
     # No file descriptor argument
     if not arg_raw_val:
-        return line
+        return
     # Parse as argument with extra information
     fd_outer_match = _ARG_WITH_EXTRA_INFO_REGEX.match(arg_raw_val)
     if not fd_outer_match:
@@ -163,7 +274,107 @@ def parse_fd_args(line):
         # Null inner part
         else:
             fd_type = location = ""
-        fd_arg = FdArg(fd_val=fd_val, fd_type=fd_type, location=location)
+        fd_arg = FdArg(fd_val=fd_val, fd_type=intern_string(fd_type), location=location)
     # Update file descriptor argument
-    line.evt_args["fd"] = fd_arg
+    args_dict["fd"] = fd_arg
+
+@simple_pass
+def parse_fd_args(line):
+    """ Parse file descriptor arguments for log line. """
+    _parse_fd_arg(line.evt_args)
     return line
+
+def _parse_fused_args(line, wanted_args, event_opt_args, fd_args, strict_parsing, arg_extractors):
+    """ Parse arguments, option arguments and file descriptor argument of line. """
+    wanted_args = _line_wanted_args(wanted_args, line.evt_type)
+    # No argument is wanted
+    if wanted_args is not None and not wanted_args:
+        line.evt_args = {}
+        return
+    args_dict = _parse_args(line.evt_args, strict_parsing, arg_extractors, wanted_args)
+    line.evt_args = args_dict
+    opt_args = event_opt_args.get(line.evt_type)
+    if opt_args:
+        _parse_option_args(args_dict, opt_args)
+    if fd_args:
+        _parse_fd_arg(args_dict)
+
+def parse_lines_fused(exclude_events=(), wanted_args=None, event_opt_args={}, fd_args=False,
+    strict_parsing=False, arg_extractors=ARG_EXTRACTORS_PRESET, log_format=DEFAULT_LOG_FORMAT):
+    """ Parse lines, arguments, option arguments and file descriptor arguments in a single pass. """
+    exclude_events = set(exclude_events)
+    wanted_args = _event_wanted_args(wanted_args)
+    tsv_format = log_format==TSV_LOG_FORMAT
+    # Pass generator function
+    def parse_lines_pass(raw_lines):
+        for raw_line in raw_lines:
+            line_match = None if tsv_format else _PLAIN_TIME_LINE_REGEX.match(raw_line)
+            # Tab-separated line
+            if tsv_format:
+                line = _parse_tsv_line(raw_line)
+                if line is None or line.evt_type in exclude_events:
+                    continue
+            # Unusual line
+            elif not line_match:
+                line = _parse_line(raw_line)
+                if line.evt_type in exclude_events:
+                    continue
+            else:
+                evt_num, h, m, s, ns, evt_cpu, proc_name, thread_tid, evt_dir, evt_type, evt_args \
+                    = line_match.groups()
+                # Remove given events before constructing line
+                if evt_type in exclude_events:
+                    continue
+                line = LogLine(
+                    evt_num=int(evt_num),
+                    evt_time=(int(h)*3600+int(m)*60+int(s))*(10**9)+int(ns),
+                    evt_cpu=int(evt_cpu),
+                    proc_name=intern_string(proc_name),
+                    thread_tid=int(thread_tid),
+                    evt_dir=intern_string(evt_dir),
+                    evt_type=intern_string(evt_type),
+                    evt_args=evt_args
+                )
+            # Parse arguments, option arguments and file descriptor argument
+            _parse_fused_args(line, wanted_args, event_opt_args, fd_args, strict_parsing, arg_extractors)
+            yield line
+    return parse_lines_pass
+
+def parse_line_chunks_fused(exclude_events=(), wanted_args=None, event_opt_args={}, fd_args=False,
+    strict_parsing=False, arg_extractors=ARG_EXTRACTORS_PRESET, log_format=DEFAULT_LOG_FORMAT):
+    """ Chunked version of parse_lines_fused, matching all lines of a chunk with one regular expression call. """
+    exclude_events = set(exclude_events)
+    wanted_args = _event_wanted_args(wanted_args)
+    tsv_format = log_format==TSV_LOG_FORMAT
+    parse_lines_pass = parse_lines_fused(
+        exclude_events, wanted_args, event_opt_args, fd_args, strict_parsing, arg_extractors, log_format
+    )
+    # Pass generator function
+    def parse_chunks_pass(chunks):
+        for chunk in chunks:
+            line_groups = _PLAIN_TIME_LINES_REGEX.findall("\n".join(chunk)) if not tsv_format else None
+            # Chunk with unusual lines (Or tab-separated lines, which are split one by one)
+            if tsv_format or len(line_groups)!=len(chunk):
+                yield list(parse_lines_pass(chunk))
+                continue
+            lines = []
+            for evt_num, h, m, s, ns, evt_cpu, proc_name, thread_tid, evt_dir, evt_type, evt_args \
+                in line_groups:
+                # Remove given events before constructing line
+                if evt_type in exclude_events:
+                    continue
+                line = LogLine(
+                    evt_num=int(evt_num),
+                    evt_time=(int(h)*3600+int(m)*60+int(s))*(10**9)+int(ns),
+                    evt_cpu=int(evt_cpu),
+                    proc_name=intern_string(proc_name),
+                    thread_tid=int(thread_tid),
+                    evt_dir=intern_string(evt_dir),
+                    evt_type=intern_string(evt_type),
+                    evt_args=evt_args
+                )
+                # Parse arguments, option arguments and file descriptor argument
+                _parse_fused_args(line, wanted_args, event_opt_args, fd_args, strict_parsing, arg_extractors)
+                lines.append(line)
+            yield lines
+    return parse_chunks_pass
@@ -1,14 +1,24 @@
 #! /usr/bin/env python
 from __future__ import unicode_literals, division
-import os, functools, logging
+import os, functools, itertools, logging
+from multiprocessing import Pool
 import numpy as np
-from scipy.sparse import csr_matrix
+from scipy.sparse import csr_matrix, vstack
 from six import iterkeys, iteritems
 from six.moves import range
 
-from sli.parser import parse_line, parse_args_str, parse_option_args, parse_fd_args
-from sli.processing import FreqCounter, inspect_line, log_pipeline, lines_from_file, \
-    remove_events, opt_arg_features, fd_features
+from sli.parser import parse_line, parse_tsv_lines, parse_args_str, parse_option_args, parse_fd_args, \
+    parse_lines_fused, parse_line_chunks_fused, event_wanted_args
+from sli.cache import ParsedLogCache
+from sli.profiling import PipelineProfiler
+from sli.dataset import save_counts_shard, load_counts_shard, shard_path, load_manifest, \
+    save_manifest
+from sli.processing import FreqCounter, Vocabulary, SlidingWindowCounter, inspect_line, log_pipeline, \
+    compose_passes, lines_from_file, lines_from_file_range, file_shards, log_compression, \
+    merge_freq_counts, prefilter_lines, prefilter_line_chunks, remove_events, remove_processes, \
+    chunk_lines, chunk_pass, opt_arg_features, fd_features, sample_file_blocks, lines_from_file_blocks, \
+    stride_sample_lines, reservoir_sample_lines, detect_log_format, detect_line_format, COMPRESSED_LOG_EXTENSIONS, \
+    DEFAULT_SAMPLE_BLOCK_SIZE, DEFAULT_LOG_FORMAT, TSV_LOG_FORMAT
 
 # Logger
 _logger = logging.getLogger(__name__)
@@ -23,6 +33,14 @@ _OPT_ARGS_MAP = {
     "lseek": ["whence"],
     "clone": ["flags"]
 }
+# Default events to exclude from logs
+DEFAULT_EXCLUDE_EVENTS = ("switch",)
+# Default parsed log cache size (1 GiB)
+DEFAULT_CACHE_SIZE = 1<<30
+# Training dataset parts
+_PART_NAMES = ("train", "validate", "test")
+# Line sampling modes
+SAMPLING_MODES = ("stride", "block", "reservoir")
 # File descriptor path patterns
 _FD_PATH_PATTERNS = [
     # Top-level directories
@@ -40,101 +58,304 @@ _FD_PATH_PATTERNS = [
     r"^\/var"
 ]
 
-# Log feature passes and generators
+# Log feature passes, generators, used arguments (Of all events and of specific events) and fused parser options
 _LOG_FEATURE_MAP = {
     # Option arguments
     "option-arg": (
         (lambda: parse_option_args(event_opt_args=_OPT_ARGS_MAP)),
-        (lambda: opt_arg_features(_OPT_ARGS_MAP))
+        (lambda: opt_arg_features(_OPT_ARGS_MAP)),
+        ((), _OPT_ARGS_MAP),
+        {"event_opt_args": _OPT_ARGS_MAP}
     ),
     # File descriptor arguements
     "fd": (
         parse_fd_args,
-        (lambda: fd_features(_FD_PATH_PATTERNS))
+        (lambda: fd_features(_FD_PATH_PATTERNS)),
+        (("fd",), {}),
+        {"fd_args": True}
     )
 }
 
-def run_pipeline(file_path, freq_counter, *passes, **kwargs):
-    """ Helper function for constructing and running pipelines. """
-    # Build all passes for the pipeline
-    all_passes = [
-        lines_from_file(file_path),
+def feature_passes(log_features):
+    """ Additional pipeline passes for log features. """
+    return [_LOG_FEATURE_MAP[feature][0]() for feature in log_features]
+
+def feature_generators(log_features):
+    """ Feature generators for log features. """
+    return [_LOG_FEATURE_MAP[feature][1]() for feature in log_features]
+
+def feature_args(log_features):
+    """ Names of arguments used by log features for each event type. """
+    common_args = set()
+    event_args = {}
+    for feature in log_features:
+        feature_common_args, feature_event_args = _LOG_FEATURE_MAP[feature][2]
+        common_args.update(feature_common_args)
+        for evt_type, args in iteritems(feature_event_args):
+            event_args.setdefault(evt_type, set()).update(args)
+    return event_wanted_args(common_args, event_args)
+
+def feature_fused_options(log_features):
+    """ Fused parser options for log features. """
+    fused_options = {}
+    for feature in log_features:
+        fused_options.update(_LOG_FEATURE_MAP[feature][3])
+    return fused_options
+
+def parse_passes(log_features=[], log_name=None, **kwargs):
+    """ Pipeline passes for filtering and parsing raw lines of a log (Chunked if chunk size is given). """
+    # Events and processes to exclude
+    exclude_events = kwargs.get("exclude_events", DEFAULT_EXCLUDE_EVENTS)
+    exclude_processes = kwargs.get("exclude_processes", ())
+    # Parse only arguments used by log features
+    wanted_args = feature_args(log_features)
+    # Amount of lines in each chunk (Zero for line-by-line processing)
+    chunk_size = kwargs.get("chunk_size", 0)
+    # Default or tab-separated Sysdig log
+    log_format = kwargs.get("log_format", DEFAULT_LOG_FORMAT)
+    # Group lines into chunks
+    all_passes = [chunk_lines(chunk_size)] if chunk_size else []
+    # Drop excluded events and processes before parsing
+    if exclude_events or exclude_processes:
+        prefilter = prefilter_line_chunks if chunk_size else prefilter_lines
+        all_passes.append(prefilter(exclude_events, exclude_processes, log_name, log_format))
+    # Parse lines and arguments of chunks in a single pass
+    if kwargs.get("fused_parser", False) and chunk_size:
+        return all_passes+[parse_line_chunks_fused(
+            wanted_args=wanted_args,
+            log_format=log_format,
+            **feature_fused_options(log_features)
+        )]
+    # Parse lines and arguments in a single pass
+    elif kwargs.get("fused_parser", False):
+        line_passes = [parse_lines_fused(
+            wanted_args=wanted_args,
+            log_format=log_format,
+            **feature_fused_options(log_features)
+        )]
+    else:
         # Parse line
-        parse_line(),
-        # Remove given events
-        remove_events("switch"),
-        # Parse arguments string
-        parse_args_str()
-    ]
-    # Supplied passes
-    all_passes += passes
-    # Process lines with frequence counter
-    all_passes += [
-        # Process lines with frequency counter
-        freq_counter.process_lines(training=kwargs.get("training", False))
-    ]
+        line_passes = [parse_tsv_lines() if log_format==TSV_LOG_FORMAT else parse_line()]
+        # Parse arguments string (Into empty dictionary if no argument is wanted)
+        line_passes.append(parse_args_str(wanted_args=wanted_args))
+        # Log feature passes
+        line_passes += feature_passes(log_features)
+    # Run single-line passes on each chunk
+    if chunk_size:
+        line_passes = [chunk_pass(line_pass) for line_pass in line_passes]
+    return all_passes+line_passes
+
+def sampling_pass(sampling):
+    """ Pipeline pass sampling lines of a log (Blocks are sampled as strides when reading whole file is
+        not avoidable). """
+    mode = sampling["mode"]
+    if mode in ("stride", "block"):
+        return stride_sample_lines(sampling["rate"])
+    elif mode=="reservoir":
+        return reservoir_sample_lines(sampling["size"], sampling.get("seed", 0))
+    raise ValueError("Unknown sampling mode {}".format(mode))
+
+def sampling_fraction(sampling):
+    """ Fraction of log lines kept by line sampling (Zero if unknown in advance, which overestimates
+        sampling errors). """
+    if not sampling:
+        return 1.0
+    mode = sampling["mode"]
+    if mode=="stride":
+        return 1/max(int(round(1/sampling["rate"])), 1)
+    elif mode=="block":
+        return min(sampling["rate"], 1.0)
+    return 0.0
+
+def run_pipeline(file_path, freq_counter, log_features=[], **kwargs):
+    """ Helper function for constructing and running pipelines. """
+    shard = kwargs.get("shard")
+    # Detect default or tab-separated Sysdig log
+    if "log_format" not in kwargs:
+        kwargs["log_format"] = detect_log_format(file_path)
+    # Read parsed lines from cache
+    cached_lines = None
+    cache_dir = kwargs.get("cache_dir")
+    if cache_dir and not shard:
+        cache = ParsedLogCache(
+            cache_dir,
+            kwargs.get("cache_size", DEFAULT_CACHE_SIZE),
+            event_opt_args=_OPT_ARGS_MAP
+        )
+        cached_lines = cache.lines(file_path, rebuild=kwargs.get("rebuild_cache", False))
+    # Line sampling options
+    sampling = kwargs.get("sampling")
+    # Read whole log file, a shard of it or sampled blocks of it
+    if shard:
+        source = lines_from_file_range(file_path, *shard)
+    elif cached_lines is None and sampling and sampling["mode"]=="block" and log_compression(file_path) is None:
+        source = lines_from_file_blocks(file_path, sample_file_blocks(
+            file_path,
+            sampling["rate"],
+            sampling.get("seed", 0),
+            sampling.get("block_size", DEFAULT_SAMPLE_BLOCK_SIZE)
+        ))
+        # Lines are already sampled
+        sampling = None
+    elif cached_lines is None:
+        source = lines_from_file(file_path)
+    # Amount of lines in each chunk (Zero for line-by-line processing)
+    chunk_size = kwargs.get("chunk_size", 0)
+    # Cached lines are already parsed
+    if cached_lines is not None:
+        filter_passes = [
+            remove_events(*kwargs.get("exclude_events", DEFAULT_EXCLUDE_EVENTS)),
+            remove_processes(*kwargs.get("exclude_processes", ()))
+        ]
+        if chunk_size:
+            filter_passes = [chunk_lines(chunk_size)]+[chunk_pass(filter_pass) for filter_pass in filter_passes]
+        all_passes = [cached_lines]+filter_passes
+    else:
+        all_passes = [source]+parse_passes(log_features, file_path, **kwargs)
+    # Sample lines before filtering and parsing
+    if sampling:
+        all_passes.insert(1, sampling_pass(sampling))
+    # Process lines with frequency counter
+    training = kwargs.get("training", False)
+    if chunk_size:
+        all_passes.append(freq_counter.process_line_chunks(training=training))
+    else:
+        all_passes.append(freq_counter.process_lines(training=training))
+    # Record statistics of each pass
+    profiler = kwargs.get("profiler")
+    if profiler is not None:
+        return profiler.log_pipeline(file_path, *all_passes)
     return log_pipeline(*all_passes)
 
+# Worker process pipeline context
+_worker_context = {}
+
+def _init_worker(log_features, pipeline_options, vocabulary, hashing):
+    """ Initialize log features, pipeline options and frequency counter for worker process. """
+    _worker_context["log_features"] = log_features
+    _worker_context["pipeline_options"] = pipeline_options
+    _worker_context["freq_counter"] = FreqCounter(
+        processes=set(),
+        evt_feature_tuples=set(),
+        feature_generators=feature_generators(log_features),
+        vocabulary=vocabulary,
+        **hashing
+    )
+
+def _run_pipeline_worker(task):
+    """ Run pipeline for a log file or log file shard in worker process (Returning its profiler if profiled). """
+    file_path, shard, profile = task
+    profiler = PipelineProfiler() if profile else None
+    result = run_pipeline(
+        file_path,
+        _worker_context["freq_counter"],
+        _worker_context["log_features"],
+        shard=shard,
+        profiler=profiler,
+        **_worker_context["pipeline_options"]
+    )
+    return result, profiler
+
+def _merge_worker_profilers(results, profiler):
+    """ Yield results of worker processes, merging their profilers into given profiler. """
+    for result, worker_profiler in results:
+        if worker_profiler is not None:
+            profiler.merge(worker_profiler)
+        yield result
+
+def _freq_matrix(freq_counter, log_file_datum, profiler=None, sampling_fraction=None):
+    """ Count frequency on each log (Recorded by profiler if given). """
+    if profiler is None:
+        return freq_counter.freq_matrix(log_file_datum, sampling_fraction)
+    return profiler.call("freq_matrix", freq_counter.freq_matrix, log_file_datum, sampling_fraction)
+
+def make_pool(log_features, jobs=1, pipeline_options={}, vocabulary=None, hashing={}):
+    """ Create worker pool for processing logs in parallel (None for serial processing). Workers count
+        lines by column if vocabulary or hashing parameters are given. """
+    if jobs<=1:
+        return None
+    return Pool(
+        jobs,
+        initializer=_init_worker,
+        initargs=(list(log_features), pipeline_options, vocabulary, hashing)
+    )
+
+def run_pipelines(file_paths, freq_counter, log_features=[], **kwargs):
+    """ Run pipeline for each log file and yield results in order. """
+    training = kwargs.get("training", False)
+    pool = kwargs.get("pool")
+    shards = kwargs.get("shards", 1)
+    pipeline_options = kwargs.get("pipeline_options", {})
+    profiler = kwargs.get("profiler")
+    # Reservoir samples a fixed amount of lines of whole log files, so they are not split into shards
+    if (pipeline_options.get("sampling") or {}).get("mode")=="reservoir":
+        shards = 1
+    # Split each log file into shards
+    tasks = []
+    n_file_shards = []
+    for file_path in file_paths:
+        # Compressed log files cannot be split by byte range
+        if shards>1 and log_compression(file_path) is None:
+            log_shards = file_shards(file_path, shards)
+        else:
+            log_shards = [None]
+        tasks += [(file_path, shard) for shard in log_shards]
+        n_file_shards.append(len(log_shards))
+    # Serial processing
+    if pool is None:
+        results = (
+            run_pipeline(
+                file_path,
+                freq_counter,
+                log_features,
+                training=training,
+                shard=shard,
+                profiler=profiler,
+                **pipeline_options
+            )
+            for file_path, shard in tasks
+        )
+    # Parallel processing
+    else:
+        results = pool.imap(_run_pipeline_worker, [
+            (file_path, shard, profiler is not None) for file_path, shard in tasks
+        ])
+        results = _merge_worker_profilers(results, profiler)
+    # Collect results of each log file
+    for n_shards in n_file_shards:
+        if n_shards==1:
+            result = next(results)
+        # Merge results of all shards
+        else:
+            result = [merge_freq_counts(
+                log_file_datum for _ in range(n_shards) for log_file_datum in next(results)
+            )]
+        # Merge vocabulary of training logs
+        if training and pool is not None:
+            for proc_evt_feature_count, _ in result:
+                freq_counter.update_vocabulary(proc_evt_feature_count)
+        yield result
+
 def log_dataset_path(dataset_root, dataset_name, i):
-    """ Helper function for assembling file path in log dataset. """
-    return os.path.join(
+    """ Helper function for assembling file path in log dataset (Resolving compressed variants). """
+    file_path = os.path.join(
         dataset_root,
         dataset_name,
         "{}log-{}.txt".format(dataset_name, i)
     )
+    # Use compressed log file if plain log file does not exist
+    if not os.path.exists(file_path):
+        for ext in COMPRESSED_LOG_EXTENSIONS:
+            if os.path.exists(file_path+ext):
+                return file_path+ext
+    return file_path
 
-def gen_training_dataset_part(dataset_root, idx_map, freq_counter, *passes, **kwargs):
-    """ Generate training, validation or testing part of the training dataset. """
-    # Temporary result and labels
-    x_tmp = []
-    labels = []
-    # Dataset names
-    dataset_names = sorted(iterkeys(idx_map))
-    # Process all training set
-    for label, dataset_name in enumerate(dataset_names):
-        idx_array = idx_map[dataset_name]
-        idx_size = len(idx_array)
-        # Process logs
-        for i, idx in enumerate(idx_array):
-            _logger.debug(
-                "[Training] Processing %s log #%d (%d/%d)",
-                dataset_name, idx+1, i+1, idx_size
-            )
-            # Run pipeline for each log
-            x_tmp += run_pipeline(
-                log_dataset_path(dataset_root, dataset_name, idx+1),
-                freq_counter,
-                *passes,
-                training=kwargs.get("training", False)
-            )
-        # Append labels
-        labels = np.concatenate([labels, np.repeat(label, idx_size)])
-    # Count frequency on each log
-    x = log_pipeline(x_tmp, freq_counter.count_freq)
-    # Reshape matrix into vector
-    x = np.reshape(x, (len(x), -1))
-    return x, labels
-
-def passes_features(log_features):
-    """ Additional passes and feature generators for log features. """
-    # Additional pipeline passes
-    passes = [_LOG_FEATURE_MAP[feature][0]() for feature in log_features]
-    # Additional feature generators
-    feature_generators = [_LOG_FEATURE_MAP[feature][1]() for feature in log_features]
-    return passes, feature_generators
-
-def gen_training_dataset(dataset_root, dataset_size_map, log_features=[]):
-    """ Process logs and generate full training dataset with training, validation and testing data. """
-    # Pipeline passes and feature generators
-    passes, feature_generators = passes_features(log_features)
-    # Frequency counter
-    freq_counter = FreqCounter(feature_generators=feature_generators)
+def split_dataset(dataset_size_map):
+    """ Randomly split logs of each category into training, validation and testing set indexes. """
     # Training, validation and testing set indexes
     train_idx_map = {}
     validate_idx_map = {}
     test_idx_map = {}
-    # Dataset names
-    dataset_names = sorted(iterkeys(dataset_size_map))
     # Generate indexes
     for dataset_name, size in iteritems(dataset_size_map):
         rand_idx = np.random.permutation(size)
@@ -145,40 +366,376 @@ def gen_training_dataset(dataset_root, dataset_size_map, log_features=[]):
         train_idx_map[dataset_name] = rand_idx[:train_max]
         validate_idx_map[dataset_name] = rand_idx[train_max:validate_max]
         test_idx_map[dataset_name] = rand_idx[validate_max:]
-    # Training, validation and testing data
-    _logger.debug("[Training] Processing training set")
-    x_train, labels_train = gen_training_dataset_part(
-        dataset_root, train_idx_map, freq_counter, *passes, training=True
+    return train_idx_map, validate_idx_map, test_idx_map
+
+def training_part_logs(idx_map):
+    """ Label, dataset name and index of each log in a training dataset part. """
+    # Dataset names
+    dataset_names = sorted(iterkeys(idx_map))
+    return [
+        (label, dataset_name, idx)
+        for label, dataset_name in enumerate(dataset_names)
+        for idx in idx_map[dataset_name]
+    ]
+
+def process_training_logs(dataset_root, logs, freq_counter, log_features=[], **kwargs):
+    """ Run pipeline for logs of a training dataset part and yield results in order. """
+    results = run_pipelines(
+        (log_dataset_path(dataset_root, dataset_name, idx+1) for _, dataset_name, idx in logs),
+        freq_counter,
+        log_features,
+        training=kwargs.get("training", False),
+        pool=kwargs.get("pool"),
+        pipeline_options=kwargs.get("pipeline_options", {}),
+        profiler=kwargs.get("profiler")
     )
-    _logger.debug("[Training] Processing validation set")
-    x_validate, labels_validate = gen_training_dataset_part(
-        dataset_root, validate_idx_map, freq_counter, *passes
+    for i, ((_, dataset_name, idx), result) in enumerate(zip(logs, results)):
+        _logger.debug(
+            "[Training] Processed %s log #%d (%d/%d)",
+            dataset_name, idx+1, i+1, len(logs)
+        )
+        yield result
+
+def gen_training_dataset_part(dataset_root, idx_map, freq_counter, log_features=[], **kwargs):
+    """ Generate training, validation or testing part of the training dataset. """
+    # Logs of training dataset part
+    logs = training_part_logs(idx_map)
+    # Temporary result
+    x_tmp = []
+    for result in process_training_logs(dataset_root, logs, freq_counter, log_features, **kwargs):
+        x_tmp += result
+    # Count frequency on each log
+    x = _freq_matrix(freq_counter, x_tmp, kwargs.get("profiler"))
+    labels = np.array([label for label, _, _ in logs], dtype=float)
+    return x, labels
+
+def gen_hashed_training_dataset_parts(dataset_root, idx_maps, freq_counter, log_features=[], **kwargs):
+    """ Generate all training dataset parts in a single pass (Hashed columns need no vocabulary). """
+    # Logs of each training dataset part
+    part_logs = [training_part_logs(idx_map) for idx_map in idx_maps]
+    results = process_training_logs(
+        dataset_root,
+        [log for logs in part_logs for log in logs],
+        freq_counter,
+        log_features,
+        **kwargs
+    )
+    dataset_parts = []
+    for logs in part_logs:
+        # Temporary result
+        x_tmp = []
+        for result in itertools.islice(results, len(logs)):
+            x_tmp += result
+        # Count frequency on each log
+        dataset_parts += [
+            _freq_matrix(freq_counter, x_tmp, kwargs.get("profiler")),
+            np.array([label for label, _, _ in logs], dtype=float)
+        ]
+    return dataset_parts
+
+def gen_training_dataset_shards(dataset_root, dataset_size_map, work_dir, log_features=[], jobs=1,
+    shard_size=100, hashing={}, pipeline_options={}, profiler=None):
+    """ Process logs of training dataset into shards in working directory, skipping completed shards. """
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+    # Load or create manifest
+    manifest = load_manifest(work_dir)
+    if manifest is None:
+        idx_maps = split_dataset(dataset_size_map)
+        manifest = {
+            "dataset_size_map": dataset_size_map,
+            "log_features": list(log_features),
+            "shard_size": shard_size,
+            "hashing": hashing,
+            "idx_maps": dict((
+                (part_name, dict((
+                    (dataset_name, idx_array.tolist()) for dataset_name, idx_array in iteritems(idx_map)
+                )))
+                for part_name, idx_map in zip(_PART_NAMES, idx_maps)
+            ))
+        }
+        save_manifest(work_dir, manifest)
+    elif manifest["dataset_size_map"]!=dataset_size_map or manifest["log_features"]!=list(log_features) \
+        or manifest.get("hashing", {})!=hashing:
+        raise ValueError("Working directory contains shards of another training dataset")
+    shard_size = manifest["shard_size"]
+    # Frequency counter
+    freq_counter = FreqCounter(
+        processes=set(),
+        evt_feature_tuples=set(),
+        feature_generators=feature_generators(log_features),
+        **hashing
     )
-    _logger.debug("[Training] Processing testing set")
-    x_test, labels_test = gen_training_dataset_part(
-        dataset_root, test_idx_map, freq_counter, *passes
+    # Worker pool
+    pool = make_pool(log_features, jobs, pipeline_options, hashing=hashing)
+    try:
+        for part_name in _PART_NAMES:
+            _logger.debug("[Training] Processing %s set", part_name)
+            # Logs of training dataset part
+            logs = training_part_logs(manifest["idx_maps"][part_name])
+            n_shards = _n_part_shards(manifest, part_name)
+            for i in range(n_shards):
+                path = shard_path(work_dir, part_name, i)
+                # Shard already completed
+                if os.path.exists(path):
+                    _logger.debug("[Training] Skipped completed %s shard (%d/%d)", part_name, i+1, n_shards)
+                    continue
+                # Process logs of shard
+                shard_logs = logs[i*shard_size:(i+1)*shard_size]
+                log_file_datum = []
+                results = process_training_logs(
+                    dataset_root,
+                    shard_logs,
+                    freq_counter,
+                    log_features,
+                    pool=pool,
+                    pipeline_options=pipeline_options,
+                    profiler=profiler
+                )
+                for result in results:
+                    log_file_datum += result
+                save_counts_shard(path, log_file_datum, [label for label, _, _ in shard_logs])
+                _logger.debug("[Training] Saved %s shard (%d/%d)", part_name, i+1, n_shards)
+    finally:
+        if pool:
+            pool.terminate()
+
+def _n_part_shards(manifest, part_name):
+    """ Amount of shards of a training dataset part. """
+    n_logs = sum(len(idx_array) for idx_array in manifest["idx_maps"][part_name].values())
+    shard_size = manifest["shard_size"]
+    return (n_logs+shard_size-1)//shard_size
+
+def _load_part_shards(work_dir, manifest, part_name, labels):
+    """ Load counts of all logs in a training dataset part and collect their labels. """
+    for i in range(_n_part_shards(manifest, part_name)):
+        log_file_datum, shard_labels = load_counts_shard(shard_path(work_dir, part_name, i))
+        labels += shard_labels
+        for item in log_file_datum:
+            yield item
+
+def finalize_training_dataset(work_dir, profiler=None):
+    """ Stitch shards in working directory into training, validation and testing data. """
+    manifest = load_manifest(work_dir)
+    hashing = manifest.get("hashing", {})
+    # Build vocabulary from training logs
+    freq_counter = FreqCounter(processes=set(), evt_feature_tuples=set(), **hashing)
+    if not hashing:
+        for proc_evt_feature_count, _ in _load_part_shards(work_dir, manifest, "train", []):
+            freq_counter.update_vocabulary(proc_evt_feature_count)
+    vocabulary = freq_counter.freeze()
+    # Count frequency on each log of training, validation and testing set
+    dataset_parts = []
+    for part_name in _PART_NAMES:
+        _logger.debug("[Training] Finalizing %s set", part_name)
+        labels = []
+        x = _freq_matrix(freq_counter, _load_part_shards(work_dir, manifest, part_name, labels), profiler)
+        dataset_parts += [x, np.array(labels, dtype=float)]
+    return tuple(dataset_parts)+(
+        sorted(iterkeys(manifest["dataset_size_map"])),
+        vocabulary.processes if vocabulary is not None else [],
+        vocabulary.evt_feature_tuples if vocabulary is not None else [],
+        manifest["log_features"],
+        hashing
+    )
+
+def gen_training_dataset(dataset_root, dataset_size_map, log_features=[], jobs=1, work_dir=None,
+    shard_size=100, hashing={}, pipeline_options={}, profiler=None):
+    """ Process logs and generate full training dataset with training, validation and testing data.
+        (Columns are hash buckets instead of vocabulary if hashing parameters are given; pass statistics
+        are recorded by profiler if given) """
+    # Process logs into on-disk shards
+    if work_dir:
+        gen_training_dataset_shards(
+            dataset_root,
+            dataset_size_map,
+            work_dir,
+            log_features,
+            jobs,
+            shard_size,
+            hashing,
+            pipeline_options,
+            profiler
+        )
+        return finalize_training_dataset(work_dir, profiler)
+    # Frequency counter
+    freq_counter = FreqCounter(
+        processes=set(),
+        evt_feature_tuples=set(),
+        feature_generators=feature_generators(log_features),
+        **hashing
     )
-    # Compress feature data for smaller file size
-    return csr_matrix(x_train), \
+    # Dataset names
+    dataset_names = sorted(iterkeys(dataset_size_map))
+    # Training, validation and testing set indexes
+    train_idx_map, validate_idx_map, test_idx_map = split_dataset(dataset_size_map)
+    # Worker pool
+    pool = make_pool(log_features, jobs, pipeline_options, hashing=hashing)
+    try:
+        # Training, validation and testing data
+        if hashing:
+            _logger.debug("[Training] Processing training, validation and testing set")
+            x_train, labels_train, x_validate, labels_validate, x_test, labels_test = \
+                gen_hashed_training_dataset_parts(
+                    dataset_root,
+                    (train_idx_map, validate_idx_map, test_idx_map),
+                    freq_counter,
+                    log_features,
+                    pool=pool,
+                    pipeline_options=pipeline_options,
+                    profiler=profiler
+                )
+        else:
+            _logger.debug("[Training] Processing training set")
+            x_train, labels_train = gen_training_dataset_part(
+                dataset_root,
+                train_idx_map,
+                freq_counter,
+                log_features,
+                training=True,
+                pool=pool,
+                pipeline_options=pipeline_options,
+                profiler=profiler
+            )
+            _logger.debug("[Training] Processing validation set")
+            x_validate, labels_validate = gen_training_dataset_part(
+                dataset_root,
+                validate_idx_map,
+                freq_counter,
+                log_features,
+                pool=pool,
+                pipeline_options=pipeline_options,
+                profiler=profiler
+            )
+            _logger.debug("[Training] Processing testing set")
+            x_test, labels_test = gen_training_dataset_part(
+                dataset_root,
+                test_idx_map,
+                freq_counter,
+                log_features,
+                pool=pool,
+                pipeline_options=pipeline_options,
+                profiler=profiler
+            )
+    finally:
+        if pool:
+            pool.terminate()
+    # Frozen vocabulary (Processes and event-feature tuples are stored in ID order)
+    vocabulary = freq_counter.vocabulary
+    return x_train, \
         labels_train, \
-        csr_matrix(x_validate), \
+        x_validate, \
         labels_validate, \
-        csr_matrix(x_test), \
+        x_test, \
         labels_test, \
         dataset_names, \
-        sorted(freq_counter.processes), \
-        sorted(freq_counter.evt_feature_tuples), \
-        log_features
-
-def gen_detection_dataset(dataset_path, processes, evt_feature_tuples, n_logs=0, log_features=[]):
-    """ Process logs and generate detection dataset. """
-    # Pipeline passes and feature generators
-    passes, feature_generators = passes_features(log_features)
+        vocabulary.processes if vocabulary is not None else [], \
+        vocabulary.evt_feature_tuples if vocabulary is not None else [], \
+        log_features, \
+        hashing
+
+def dataset_log_counts(training_dataset):
+    """ Amount of logs of each category in a training dataset (Logs of each category are numbered
+        consecutively, so these are also the numbers of last logs). """
+    dataset_names = training_dataset[6]
+    labels = np.concatenate([np.asarray(training_dataset[i], dtype=np.int64) for i in (1, 3, 5)])
+    counts = np.bincount(labels, minlength=len(dataset_names))
+    return dict((dataset_name, int(count)) for dataset_name, count in zip(dataset_names, counts))
+
+def extend_training_dataset(training_dataset, dataset_root, dataset_size_delta, jobs=1, pipeline_options={},
+    profiler=None):
+    """ Extend training dataset with additional logs of existing or new categories, processing new logs
+        only. Existing logs keep their training, validation and testing parts; new vocabulary entries are
+        appended as new columns and existing rows are remapped to them. """
+    x_parts = training_dataset[0:6:2]
+    label_parts = training_dataset[1:6:2]
+    dataset_names, processes, evt_feature_tuples, log_features = training_dataset[6:10]
+    hashing = dict(training_dataset[10]) if len(training_dataset)>10 else {}
+    # Amount of logs already in dataset
+    log_counts = dataset_log_counts(training_dataset)
+    # Labels of existing logs change if new categories sort before them
+    new_dataset_names = sorted(set(dataset_names)|set(iterkeys(dataset_size_delta)))
+    label_map = np.array([new_dataset_names.index(dataset_name) for dataset_name in dataset_names], dtype=float)
+    # Split new logs, which are numbered after existing logs of each category
+    idx_maps = split_dataset(dataset_size_delta)
+    for idx_map in idx_maps:
+        for dataset_name in new_dataset_names:
+            idx_map[dataset_name] = idx_map.get(dataset_name, np.zeros(0, dtype=np.int64)) \
+                +log_counts.get(dataset_name, 0)
+    # Frequency counter
+    base_vocabulary = None if hashing else Vocabulary(processes, evt_feature_tuples)
+    freq_counter = FreqCounter(
+        processes=set(),
+        evt_feature_tuples=set(),
+        feature_generators=feature_generators(log_features),
+        base_vocabulary=base_vocabulary,
+        **hashing
+    )
+    # Worker pool
+    pool = make_pool(log_features, jobs, pipeline_options, hashing=hashing)
+    try:
+        # Training, validation and testing data of new logs
+        if hashing:
+            _logger.debug("[Training] Processing new training, validation and testing logs")
+            new_parts = gen_hashed_training_dataset_parts(
+                dataset_root,
+                idx_maps,
+                freq_counter,
+                log_features,
+                pool=pool,
+                pipeline_options=pipeline_options,
+                profiler=profiler
+            )
+        else:
+            new_parts = []
+            for part_name, idx_map in zip(_PART_NAMES, idx_maps):
+                _logger.debug("[Training] Processing new %s logs", part_name)
+                new_parts += gen_training_dataset_part(
+                    dataset_root,
+                    idx_map,
+                    freq_counter,
+                    log_features,
+                    training=part_name=="train",
+                    pool=pool,
+                    pipeline_options=pipeline_options,
+                    profiler=profiler
+                )
+    finally:
+        if pool:
+            pool.terminate()
+    # Extended vocabulary
+    vocabulary = freq_counter.vocabulary
+    # Append new rows to remapped existing rows
+    dataset_parts = []
+    for x, labels, x_new, labels_new in zip(x_parts, label_parts, new_parts[0::2], new_parts[1::2]):
+        x = csr_matrix(x)
+        if vocabulary is not None:
+            x = csr_matrix(
+                (x.data, vocabulary.remap_columns(x.indices, base_vocabulary), x.indptr),
+                shape=(x.shape[0], vocabulary.n_features())
+            )
+        dataset_parts += [
+            vstack([x, x_new], format="csr"),
+            np.concatenate([label_map[np.asarray(labels, dtype=np.int64)], labels_new])
+        ]
+    return tuple(dataset_parts)+(
+        new_dataset_names,
+        vocabulary.processes if vocabulary is not None else [],
+        vocabulary.evt_feature_tuples if vocabulary is not None else [],
+        log_features,
+        hashing
+    )
+
+def gen_detection_dataset(dataset_path, vocabulary, n_logs=0, log_features=[], jobs=1, shards=1, hashing={},
+    pipeline_options={}, profiler=None, return_error=False):
+    """ Process logs and generate detection dataset (Pass statistics are recorded by profiler if given).
+        If return_error is set, relative standard errors of frequencies caused by line sampling
+        ("sampling" pipeline option) are returned as a second matrix. """
     # Frequency counter
     freq_counter = FreqCounter(
-        processes=processes,
-        evt_feature_tuples=evt_feature_tuples,
-        feature_generators=feature_generators
+        feature_generators=feature_generators(log_features),
+        vocabulary=vocabulary,
+        **hashing
     )
     # Single log
     if n_logs==0:
@@ -190,20 +747,59 @@ def gen_detection_dataset(dataset_path, processes, evt_feature_tuples, n_logs=0,
         log_names = (log_dataset_path(dataset_parent, dataset_name, i+1) for i in range(n_logs))
     # Temporary result
     x_tmp = []
-    # Process logs
-    for i, log_name in enumerate(log_names):
-        # Prompt progress
-        if n_logs>0:
-            _logger.debug(
-                "[Detection] Processing %s log (%d/%d)",
-                dataset_name, i+1, n_logs
-            )
-        else:
-            _logger.debug("[Detection] Processing log %s", dataset_path)
-        # Run pipeline for each log
-        x_tmp += run_pipeline(log_name, freq_counter, *passes)
+    # Worker pool
+    pool = make_pool(log_features, jobs, pipeline_options, vocabulary, hashing)
+    try:
+        # Process logs
+        results = run_pipelines(
+            log_names,
+            freq_counter,
+            log_features,
+            pool=pool,
+            shards=shards,
+            pipeline_options=pipeline_options,
+            profiler=profiler
+        )
+        for i, result in enumerate(results):
+            # Prompt progress
+            if n_logs>0:
+                _logger.debug(
+                    "[Detection] Processed %s log (%d/%d)",
+                    dataset_name, i+1, n_logs
+                )
+            else:
+                _logger.debug("[Detection] Processed log %s", dataset_path)
+            x_tmp += result
+    finally:
+        if pool:
+            pool.terminate()
     # Count frequency on each log
-    x = log_pipeline(x_tmp, freq_counter.count_freq)
-    # Reshape matrix into vector
-    x = np.reshape(x, (len(x), -1))
-    return csr_matrix(x)
+    if return_error:
+        return _freq_matrix(freq_counter, x_tmp, profiler, sampling_fraction(pipeline_options.get("sampling")))
+    return _freq_matrix(freq_counter, x_tmp, profiler)
+
+def gen_detection_stream(raw_lines, vocabulary, log_features=[], window=10.0, hop=1.0, hashing={},
+    pipeline_options={}):
+    """ Process stream of raw log lines and yield end time and detection data of sliding windows. """
+    # Frequency counter
+    freq_counter = FreqCounter(
+        feature_generators=feature_generators(log_features),
+        vocabulary=vocabulary,
+        **hashing
+    )
+    # Sliding window counter (Window length and hop in seconds)
+    window_counter = SlidingWindowCounter(freq_counter, int(window*(10**9)), int(hop*(10**9)))
+    # Windows are counted line by line
+    pipeline_options = dict(pipeline_options, chunk_size=0)
+    # Detect default or tab-separated Sysdig log from first line
+    if "log_format" not in pipeline_options:
+        raw_lines = iter(raw_lines)
+        first_line = next(raw_lines, "")
+        pipeline_options["log_format"] = detect_line_format(first_line)
+        raw_lines = itertools.chain([first_line] if first_line else [], raw_lines)
+    windows = compose_passes(
+        raw_lines,
+        *(parse_passes(log_features, **pipeline_options)+[window_counter.process_lines()])
+    )
+    for window_end, proc_evt_feature_count, lines_count in windows:
+        yield window_end, freq_counter.freq_matrix([(proc_evt_feature_count, lines_count)])
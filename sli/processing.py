@@ -1,33 +1,122 @@
 from __future__ import unicode_literals, division
-import os, re, functools, logging
+import os, io, re, json, zlib, random, functools, itertools, logging, locale, gzip, contextlib
+from collections import deque, OrderedDict
 from six import iteritems
 from six.moves import map
 import numpy as np
+from scipy.sparse import csr_matrix
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 from .types import FdArg
 
 # Logger
 _logger = logging.getLogger(__name__)
 
-def log_pipeline(source, *passes):
-    """ Log processing pipeline. """
+# Default amount of lines in each chunk for chunked pipelines
+DEFAULT_CHUNK_SIZE = 4096
+# Default amount of memoized file descriptor locations
+DEFAULT_FD_MEMO_SIZE = 1<<16
+# Default amount of memoized hash buckets of process-event-feature keys
+DEFAULT_HASH_MEMO_SIZE = 1<<16
+# Regular expression metacharacters
+_REGEX_METACHARS = set(".^$*+?{}[]|()")
+# Nano seconds per day
+_NS_PER_DAY = 24*3600*(10**9)
+# Log file read block size (1 MiB)
+_READ_BLOCK_SIZE = 1<<20
+# Default size of log file blocks for block sampling (64 KiB)
+DEFAULT_SAMPLE_BLOCK_SIZE = 1<<16
+# Compressed log file magic bytes
+_COMPRESSION_MAGICS = [
+    ("gzip", b"\x1f\x8b"),
+    ("zstd", b"\x28\xb5\x2f\xfd"),
+    ("xz", b"\xfd7zXZ\x00")
+]
+# Compressed log file extensions
+COMPRESSED_LOG_EXTENSIONS = (".gz", ".zst", ".xz")
+# Log formats (Default Sysdig output, or tab-separated output of SYSDIG_TSV_FORMAT)
+DEFAULT_LOG_FORMAT = "default"
+TSV_LOG_FORMAT = "tsv"
+# Fields of tab-separated log lines (Raw arguments are last, so they may contain tabs)
+TSV_FIELDS = ("evt.num", "evt.rawtime", "evt.cpu", "proc.name", "thread.tid", "evt.dir", "evt.type", "evt.args")
+# Sysdig output format ("-p") of tab-separated logs (Events lacking some fields are printed as well)
+SYSDIG_TSV_FORMAT = "*"+"\t".join("%"+field for field in TSV_FIELDS)
+# Header line of tab-separated logs
+_TSV_HEADER_NAME = "#sli-tsv"
+TSV_HEADER = _TSV_HEADER_NAME+"\t"+"\t".join(TSV_FIELDS)
+
+def compose_passes(source, *passes):
+    """ Lazily compose log processing passes without collecting results. """
     composed_iter = source
     # Apply previous generator to next pass
     for pass_func in passes:
         composed_iter = pass_func(composed_iter)
+    return composed_iter
+
+def log_pipeline(source, *passes):
+    """ Log processing pipeline. """
     # Collect into a list
-    return list(composed_iter)
+    return list(compose_passes(source, *passes))
+
+def pass_name(stream_pass):
+    """ Name of a pass or stream source, used in profiling summaries. """
+    name = getattr(stream_pass, "pass_name", None)
+    if name:
+        return name
+    # Partial pass functions (Such as frequency counter passes)
+    if isinstance(stream_pass, functools.partial):
+        stream_pass = stream_pass.func
+    name = getattr(stream_pass, "__name__", None)
+    # Generators of Python 2
+    if name is None and hasattr(stream_pass, "gi_code"):
+        name = stream_pass.gi_code.co_name
+    if not name or name=="<lambda>":
+        return type(stream_pass).__name__
+    # Strip private prefix and implementation suffixes
+    name = name.lstrip("_")
+    for suffix in ("_impl", "_pass"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
 
 def simple_pass(pass_functor):
     """ Convert a functor to a simple pass function. """
     @functools.wraps(pass_functor)
     def pass_func(*args, **kwargs):
-        return lambda stream: map(
+        stream_pass = lambda stream: map(
             functools.partial(pass_functor, *args, **kwargs),
             stream
         )
+        stream_pass.pass_name = pass_functor.__name__
+        return stream_pass
     return pass_func
 
+def chunk_lines(chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Group line stream into chunks (Lists) of lines. """
+    # Pass generator function
+    def chunk_lines_pass(lines):
+        lines = iter(lines)
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+    return chunk_lines_pass
+
+def chunk_pass(line_pass):
+    """ Adapt a single-line pass to run on each chunk of a chunk stream. """
+    chunk_pass_func = lambda chunks: (list(line_pass(chunk)) for chunk in chunks)
+    chunk_pass_func.pass_name = pass_name(line_pass)
+    return chunk_pass_func
+
 @simple_pass
 def inspect_line(data):
     """ Inspect line in the streamline. """
@@ -35,16 +124,266 @@ def inspect_line(data):
     # Do nothing to data except printing
     return data
 
+def lines_from_stream(stream):
+    """ Read and yield lines from text stream, such as output of a running Sysdig process. """
+    for line in stream:
+        # Remove trailing characters
+        line = line.rstrip()
+        # Yield line if it is non-empty
+        if line:
+            yield line
+
+def log_compression(log_file):
+    """ Detect compression format of log file by magic bytes (None for uncompressed file). """
+    with open(log_file, "rb") as f:
+        magic = f.read(6)
+    for compression, compression_magic in _COMPRESSION_MAGICS:
+        if magic.startswith(compression_magic):
+            return compression
+    return None
+
+@contextlib.contextmanager
+def open_log_file(log_file):
+    """ Open log file for binary reading, decompressing gzip, zstd and xz files on the fly. """
+    compression = log_compression(log_file)
+    if compression is None:
+        with io.open(log_file, "rb", buffering=_READ_BLOCK_SIZE) as f:
+            yield f
+    elif compression=="gzip":
+        with gzip.open(log_file, "rb") as f:
+            yield f
+    elif compression=="xz":
+        if lzma is None:
+            raise ImportError("lzma is required for reading xz-compressed log {}".format(log_file))
+        with lzma.open(log_file, "rb") as f:
+            yield f
+    elif compression=="zstd":
+        if zstandard is None:
+            raise ImportError("zstandard is required for reading zstd-compressed log {}".format(log_file))
+        with open(log_file, "rb") as raw_f:
+            with zstandard.ZstdDecompressor().stream_reader(raw_f) as f:
+                yield f
+
+def _read_blocks(f, size=None):
+    """ Read file in large blocks (Up to given amount of bytes if size is given). """
+    while size is None or size>0:
+        block = f.read(_READ_BLOCK_SIZE if size is None else min(_READ_BLOCK_SIZE, size))
+        if not block:
+            break
+        if size is not None:
+            size -= len(block)
+        yield block
+
+def _split_lines(text):
+    """ Split text on universal newlines into non-empty lines without trailing characters. """
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    # Remove trailing characters and empty lines
+    lines = [line.rstrip() for line in text.split("\n")]
+    return [line for line in lines if line]
+
+def _line_batches(blocks):
+    """ Decode blocks of bytes into batches of lines, carrying incomplete lines over to next block. """
+    encoding = locale.getpreferredencoding(False)
+    remainder = b""
+    for block in blocks:
+        block = remainder+block
+        # Decode complete lines only
+        split_pos = block.rfind(b"\n")+1
+        remainder = block[split_pos:]
+        yield _split_lines(block[:split_pos].decode(encoding))
+    # Last line without trailing newline
+    yield _split_lines(remainder.decode(encoding))
+
 def lines_from_file(log_file):
-    """ Read and yield lines from log file. """
-    with open(log_file) as f:
-        for line in f:
+    """ Read and yield lines from plain or compressed log file. """
+    with open_log_file(log_file) as f:
+        # Decode in large blocks and split on universal newlines like text mode reading (Whole files are not
+        # split with _line_batches, which is slower on plain logs and no faster on compressed ones)
+        for line in io.TextIOWrapper(f, encoding=locale.getpreferredencoding(False)):
             # Remove trailing characters
             line = line.rstrip()
             # Yield line if it is non-empty
             if line:
                 yield line
 
+def detect_line_format(raw_line):
+    """ Detect log format from first line of a log (Tab-separated header, or tab-separated line with numeric
+        event number and time). """
+    if raw_line.startswith(_TSV_HEADER_NAME):
+        return TSV_LOG_FORMAT
+    fields = raw_line.split("\t", 2)
+    if len(fields)==3 and fields[0].isdigit() and fields[1].isdigit():
+        return TSV_LOG_FORMAT
+    return DEFAULT_LOG_FORMAT
+
+def detect_log_format(log_file):
+    """ Detect format of plain or compressed log file from its first line. """
+    lines = lines_from_file(log_file)
+    try:
+        return detect_line_format(next(lines, ""))
+    finally:
+        lines.close()
+
+def file_shards(log_file, n_shards):
+    """ Split log file into byte ranges aligned to line boundaries. """
+    file_size = os.path.getsize(log_file)
+    offsets = [0]
+    with open(log_file, "rb") as f:
+        for i in range(1, n_shards):
+            shard_begin = file_size*i//n_shards
+            # Move to the beginning of next line
+            if shard_begin>offsets[-1]:
+                f.seek(shard_begin-1)
+                f.readline()
+                offsets.append(f.tell())
+    offsets.append(file_size)
+    # Remove empty shards
+    return [(begin, end) for begin, end in zip(offsets[:-1], offsets[1:]) if begin<end]
+
+def lines_from_file_range(log_file, begin, end):
+    """ Read and yield lines within given line-aligned byte range from uncompressed log file. """
+    with open(log_file, "rb") as f:
+        f.seek(begin)
+        for lines in _line_batches(_read_blocks(f, end-begin)):
+            for line in lines:
+                yield line
+
+def sample_file_blocks(log_file, rate, seed=0, block_size=DEFAULT_SAMPLE_BLOCK_SIZE):
+    """ Randomly choose line-aligned blocks (Byte ranges) of uncompressed log file at given sampling rate. """
+    n_blocks = max((os.path.getsize(log_file)+block_size-1)//block_size, 1)
+    blocks = file_shards(log_file, n_blocks)
+    # Sample at least one block
+    n_samples = min(max(int(round(len(blocks)*rate)), 1), len(blocks))
+    # Read blocks in file order
+    return sorted(random.Random(seed).sample(blocks, n_samples))
+
+def lines_from_file_blocks(log_file, blocks):
+    """ Read and yield lines within given line-aligned blocks of uncompressed log file. """
+    for begin, end in blocks:
+        for line in lines_from_file_range(log_file, begin, end):
+            yield line
+
+def stride_sample_lines(rate):
+    """ Keep every n-th line, where n is the reciprocal of sampling rate (Stride sampling). """
+    stride = max(int(round(1/rate)), 1)
+    # Pass function
+    def stride_sample_pass(lines):
+        return itertools.islice(lines, 0, None, stride)
+    return stride_sample_pass
+
+def reservoir_sample_lines(size, seed=0):
+    """ Keep a uniform random sample of given amount of lines (Reservoir sampling). Sampled lines are
+        yielded in their original order after the whole stream is read. """
+    # Pass generator function
+    def reservoir_sample_pass(lines):
+        rand = random.Random(seed)
+        reservoir = []
+        for i, line in enumerate(lines):
+            if i<size:
+                reservoir.append((i, line))
+            else:
+                j = rand.randint(0, i)
+                if j<size:
+                    reservoir[j] = (i, line)
+        reservoir.sort(key=lambda item: item[0])
+        for _, line in reservoir:
+            yield line
+    return reservoir_sample_pass
+
+def _raw_line_fields(raw_line):
+    """ Locate process name and event type in raw log line without parsing it.
+        Returns None if the fields cannot be located. """
+    # Thread ID follows process name, which never contains opening parenthesis
+    tid_begin = raw_line.find("(")
+    tid_end = raw_line.find(")", tid_begin)
+    if tid_begin<1 or tid_end<0 or raw_line[tid_begin-1]!=" ":
+        return None
+    if not raw_line[tid_begin+1:tid_end].isdigit():
+        return None
+    # Event direction and event type follow thread ID
+    evt_type_begin = tid_end+4
+    if raw_line[tid_end+1:tid_end+2]!=" " or raw_line[tid_end+3:evt_type_begin]!=" ":
+        return None
+    evt_type_end = raw_line.find(" ", evt_type_begin)
+    if evt_type_end<0:
+        evt_type_end = len(raw_line)
+    # Process name follows event number, time and CPU
+    head_fields = raw_line[:tid_begin-1].split(" ", 3)
+    if len(head_fields)<4:
+        return None
+    return head_fields[3], raw_line[evt_type_begin:evt_type_end]
+
+def _tsv_line_fields(raw_line):
+    """ Locate process name and event type in raw tab-separated log line without parsing it.
+        Returns None if the fields cannot be located. """
+    fields = raw_line.split("\t", 7)
+    if len(fields)<7:
+        return None
+    return fields[3], fields[6]
+
+def prefilter_lines(exclude_events=(), exclude_processes=(), log_name=None, log_format=DEFAULT_LOG_FORMAT):
+    """ Drop raw lines of given events or processes before parsing.
+        Lines whose fields cannot be located are left to the parser. """
+    exclude_events = set(exclude_events)
+    exclude_processes = set(exclude_processes)
+    line_fields = _tsv_line_fields if log_format==TSV_LOG_FORMAT else _raw_line_fields
+    # Pass generator function
+    def prefilter_pass(raw_lines):
+        n_lines = 0
+        n_dropped = 0
+        for raw_line in raw_lines:
+            n_lines += 1
+            fields = line_fields(raw_line)
+            if fields:
+                process_name, event_name = fields
+                if event_name in exclude_events or process_name in exclude_processes:
+                    n_dropped += 1
+                    continue
+            yield raw_line
+        _logger.debug(
+            "[Prefilter] Dropped %d of %d lines%s",
+            n_dropped, n_lines, "" if log_name is None else " from "+log_name
+        )
+    return prefilter_pass
+
+def prefilter_line_chunks(exclude_events=(), exclude_processes=(), log_name=None, log_format=DEFAULT_LOG_FORMAT):
+    """ Drop raw lines of given events or processes from chunks of lines before parsing.
+        Lines whose fields cannot be located are left to the parser. """
+    exclude_events = set(exclude_events)
+    exclude_processes = set(exclude_processes)
+    line_fields = _tsv_line_fields if log_format==TSV_LOG_FORMAT else _raw_line_fields
+    # Pass generator function
+    def prefilter_pass(chunks):
+        n_lines = 0
+        n_dropped = 0
+        for chunk in chunks:
+            kept_chunk = []
+            for raw_line in chunk:
+                fields = line_fields(raw_line)
+                if fields and (fields[1] in exclude_events or fields[0] in exclude_processes):
+                    continue
+                kept_chunk.append(raw_line)
+            n_lines += len(chunk)
+            n_dropped += len(chunk)-len(kept_chunk)
+            yield kept_chunk
+        _logger.debug(
+            "[Prefilter] Dropped %d of %d lines%s",
+            n_dropped, n_lines, "" if log_name is None else " from "+log_name
+        )
+    return prefilter_pass
+
+def remove_processes(*proc_names):
+    """ Remove lines of processes from log line stream. """
+    process_names = set(proc_names)
+    # Pass generator function
+    def remove_processes_pass(lines):
+        for line in lines:
+            # Filter lines by process name
+            if line.proc_name not in process_names:
+                yield line
+    return remove_processes_pass
+
 def remove_events(*evt_names):
     """ Remove events from log line stream. """
     event_names = set(evt_names)
@@ -75,10 +414,91 @@ def opt_arg_features(evt_opts_map={}):
         return features
     return feature_generator
 
-def fd_features(path_patterns=[]):
+def _literal_prefix(pattern_str):
+    """ Literal prefix matched by regular expression pattern (None if the pattern is not a plain literal). """
+    # Patterns are matched at the beginning of location
+    if pattern_str.startswith("^"):
+        pattern_str = pattern_str[1:]
+    literal = []
+    i = 0
+    while i<len(pattern_str):
+        char = pattern_str[i]
+        # Escaped character (Character classes and back references are not literal)
+        if char=="\\":
+            if i+1>=len(pattern_str) or pattern_str[i+1].isalnum():
+                return None
+            literal.append(pattern_str[i+1])
+            i += 2
+        elif char in _REGEX_METACHARS:
+            return None
+        else:
+            literal.append(char)
+            i += 1
+    return "".join(literal)
+
+class PathPatternIndex(object):
+    def __init__(self, path_patterns=[], memo_size=DEFAULT_FD_MEMO_SIZE):
+        """ Initialize index of path patterns with memoized matching results. """
+        ## Path pattern feature of each pattern
+        self.pattern_features = [("fd_path_pattern", pattern_str) for pattern_str in path_patterns]
+        ## Maximum amount of memoized locations
+        self.memo_size = memo_size
+        ## Memoized location lookups
+        self.hits = 0
+        ## Location lookups not memoized
+        self.misses = 0
+        # Pattern indexes of literal prefixes, grouped by prefix length
+        self._prefix_index = {}
+        # Pattern index and regular expression of other patterns
+        self._regex_patterns = []
+        for i, pattern_str in enumerate(path_patterns):
+            prefix = _literal_prefix(pattern_str)
+            if prefix is None:
+                self._regex_patterns.append((i, re.compile(pattern_str)))
+            else:
+                self._prefix_index.setdefault(len(prefix), {}).setdefault(prefix, []).append(i)
+        self._prefix_lengths = sorted(self._prefix_index)
+        # Path pattern features of recently used locations
+        self._memo = OrderedDict()
+    def _match(self, location):
+        """ Path pattern features of location in pattern order. """
+        indexes = []
+        # Literal prefixes
+        for length in self._prefix_lengths:
+            if length>len(location):
+                break
+            prefix_indexes = self._prefix_index[length].get(location[:length])
+            if prefix_indexes:
+                indexes += prefix_indexes
+        # Other patterns
+        for i, pattern in self._regex_patterns:
+            if pattern.match(location):
+                indexes.append(i)
+        indexes.sort()
+        return [self.pattern_features[i] for i in indexes]
+    def features(self, location):
+        """ Path pattern features of location in pattern order (Memoized for recently used locations). """
+        memo = self._memo
+        features = memo.pop(location, None)
+        # Match location against patterns
+        if features is None:
+            self.misses += 1
+            features = self._match(location)
+            # Evict least recently used location
+            if len(memo)>=self.memo_size:
+                if not memo:
+                    return features
+                memo.popitem(last=False)
+        else:
+            self.hits += 1
+        # Mark location as recently used
+        memo[location] = features
+        return features
+
+def fd_features(path_patterns=[], memo_size=DEFAULT_FD_MEMO_SIZE):
     """ Extract file descriptor features from line """
-    # Compile each pattern into regular expression
-    path_patterns = [re.compile(pattern_str) for pattern_str in path_patterns]
+    # Index path patterns
+    path_index = PathPatternIndex(path_patterns, memo_size)
     def feature_generator(line):
         features = []
         fd_arg = line.evt_args.get("fd")
@@ -92,24 +512,144 @@ def fd_features(path_patterns=[]):
         if fd_arg.fd_type!="f" and fd_arg.fd_type!="u":
             return features
         # Match path against given path patterns
-        location = fd_arg.location
-        for pattern in path_patterns:
-            if pattern.match(location):
-                features.append(("fd_path_pattern", pattern.pattern))
+        features += path_index.features(fd_arg.location)
         # Final features
         return features
+    # Expose path pattern index and its memo hit and miss counts
+    feature_generator.path_index = path_index
     return feature_generator
 
+def merge_freq_counts(log_file_datum):
+    """ Merge process-event-feature count and lines count of log file shards. """
+    merged_count = {}
+    merged_lines_count = 0
+    for proc_evt_feature_count, lines_count in log_file_datum:
+        for key, count in iteritems(proc_evt_feature_count):
+            merged_count[key] = merged_count.get(key, 0)+count
+        merged_lines_count += lines_count
+    return merged_count, merged_lines_count
+
+def feature_hash(process_name, evt_feature_tuple, seed=0):
+    """ Stable 32-bit hash of process name and event-feature tuple. """
+    key_str = json.dumps([process_name, list(evt_feature_tuple)])
+    return zlib.crc32(key_str.encode("utf-8"), seed) & 0xffffffff
+
+class Vocabulary(object):
+    def __init__(self, processes=[], evt_feature_tuples=[]):
+        """ Initialize frozen vocabulary from processes and event-feature tuples in ID order. """
+        ## Processes (Index is process ID)
+        self.processes = list(processes)
+        ## Event-feature tuples (Index is event-feature tuple ID)
+        self.evt_feature_tuples = [tuple(evt_feature_tuple) for evt_feature_tuple in evt_feature_tuples]
+        ## Process IDs
+        self.process_ids = dict((proc, i) for i, proc in enumerate(self.processes))
+        ## Event-feature tuple IDs
+        self.evt_feature_ids = dict((evt_opt, i) for i, evt_opt in enumerate(self.evt_feature_tuples))
+        ## ID of unknown process
+        self.unknown_process_id = len(self.processes)
+        ## ID of unknown event-feature tuple
+        self.unknown_evt_feature_id = len(self.evt_feature_tuples)
+        ## Columns of each process (Including unknown event-feature tuple)
+        self.width = len(self.evt_feature_tuples)+1
+    @classmethod
+    def build(cls, processes, evt_feature_tuples):
+        """ Build vocabulary from sets of processes and event-feature tuples collected in training. """
+        return cls(sorted(processes), sorted(evt_feature_tuples))
+    def extend(self, processes, evt_feature_tuples):
+        """ Extend vocabulary with processes and event-feature tuples of new training logs. New entries are
+            appended in sorted order, so existing IDs are kept. """
+        return Vocabulary(
+            self.processes+sorted(set(processes)-set(self.processes)),
+            self.evt_feature_tuples+sorted(set(evt_feature_tuples)-set(self.evt_feature_tuples))
+        )
+    def n_features(self):
+        """ Width of feature rows (Including unknown process and event-feature tuple). """
+        return (self.unknown_process_id+1)*self.width
+    def column(self, key):
+        """ Column of process-event-feature key in flattened frequency matrix. """
+        process_id = self.process_ids.get(key[0], self.unknown_process_id)
+        return process_id*self.width+self.evt_feature_ids.get(key[1], self.unknown_evt_feature_id)
+    def remap_columns(self, columns, vocabulary):
+        """ Map columns of a vocabulary this vocabulary extends to columns of this vocabulary (Unknown
+            process and event-feature tuple stay unknown). Column order is preserved. """
+        process_ids, evt_feature_ids = np.divmod(np.asarray(columns, dtype=np.int64), vocabulary.width)
+        process_ids[process_ids==vocabulary.unknown_process_id] = self.unknown_process_id
+        evt_feature_ids[evt_feature_ids==vocabulary.unknown_evt_feature_id] = self.unknown_evt_feature_id
+        return process_ids*self.width+evt_feature_ids
+
 class FreqCounter(object):
-    def __init__(self, processes=set(), evt_feature_tuples=set(), feature_generators=[]):
-        """ Initialize feature frequency counter. """
+    def __init__(self, processes=set(), evt_feature_tuples=set(), feature_generators=[], n_buckets=0,
+        hash_seed=0, vocabulary=None, base_vocabulary=None, hash_memo_size=DEFAULT_HASH_MEMO_SIZE):
+        """ Initialize feature frequency counter (Hashing process-event-feature keys into buckets if
+            amount of buckets is given, or extending base vocabulary when frozen if it is given). """
         ## Processes set
         self.processes = processes
         ## Event-feature tuples set
         self.evt_feature_tuples = evt_feature_tuples
         ## Discrete feature generators
         self.feature_generators = feature_generators
+        ## Amount of hash buckets (Zero for vocabulary-based columns)
+        self.n_buckets = n_buckets
+        ## Hash seed
+        self.hash_seed = hash_seed
+        ## Maximum amount of memoized hash buckets
+        self.hash_memo_size = hash_memo_size
+        ## Frozen vocabulary (Lines are counted by column once available)
+        self.vocabulary = vocabulary
+        ## Vocabulary extended by collected processes and event-feature tuples when frozen
+        self.base_vocabulary = base_vocabulary
+        # Hash bucket of recently used process-event-feature keys
+        self._key_buckets = OrderedDict()
+    def line_evt_feature_tuples(self, line):
+        """ Event-feature tuples of a log line. """
+        event_name = line.evt_type
+        # Build event-discrete feature tuples
+        # (Format: (event_name, feature_name, feature_value))
+        evt_feature_tuples = []
+        for generator in self.feature_generators:
+            evt_feature_tuples += [
+                (event_name, feature_name, feature_value)
+                for feature_name, feature_value in generator(line)
+            ]
+        # No tuples built, default to event name only
+        if not evt_feature_tuples:
+            return [(event_name,)]
+        return evt_feature_tuples
+    def line_keys(self, line):
+        """ Process-event-feature keys of a log line. """
+        process_name = line.proc_name
+        return [
+            (process_name, evt_feature_tuple)
+            for evt_feature_tuple in self.line_evt_feature_tuples(line)
+        ]
+    def _vocabulary_line_columns(self, line):
+        """ Vocabulary-based columns of a log line. """
+        vocabulary = self.vocabulary
+        evt_feature_ids = vocabulary.evt_feature_ids
+        unknown_evt_feature_id = vocabulary.unknown_evt_feature_id
+        # Offset of process row in flattened frequency matrix
+        offset = vocabulary.process_ids.get(line.proc_name, vocabulary.unknown_process_id)*vocabulary.width
+        return [
+            offset+evt_feature_ids.get(evt_feature_tuple, unknown_evt_feature_id)
+            for evt_feature_tuple in self.line_evt_feature_tuples(line)
+        ]
+    def _hashed_line_columns(self, line):
+        """ Hash bucket columns of a log line. """
+        return [self._bucket_column(key) for key in self.line_keys(line)]
+    def encodes_lines(self):
+        """ Whether lines are counted by column instead of process-event-feature key. """
+        return bool(self.n_buckets) or self.vocabulary is not None
+    def key_func(self):
+        """ Function mapping log line to its counted keys (Columns if features are hashed or vocabulary
+            is frozen). """
+        if self.n_buckets:
+            return self._hashed_line_columns
+        elif self.vocabulary is not None:
+            return self._vocabulary_line_columns
+        return self.line_keys
     def _process_lines_impl(self, lines, training):
+        line_keys = self.key_func()
+        training = training and not self.encodes_lines()
         # Process-event-feature count
         proc_evt_feature_count = {}
         # Lines count
@@ -117,56 +657,274 @@ class FreqCounter(object):
         for line in lines:
             # Update lines count
             lines_count += 1
-            # Process and event name
-            process_name = line.proc_name
-            event_name = line.evt_type
-            # Build event-discrete feature tuples
-            # (Format: (event_name, feature_name, feature_value))
-            evt_feature_tuples = []
-            for generator in self.feature_generators:
-                evt_feature_tuples += [
-                    (event_name, feature_name, feature_value)
-                    for feature_name, feature_value in generator(line)
-                ]
-            # No tuples built, default to process name only    
-            if not evt_feature_tuples:
-                evt_feature_tuples.append((event_name,))
-            # Process each tuple
-            for evt_feature_tuple in evt_feature_tuples:
+            # Process each process-event-feature key
+            for key in line_keys(line):
                 # Add process name and event-feature tuple
                 if training:
-                    self.processes.add(process_name)
-                    self.evt_feature_tuples.add(evt_feature_tuple)
+                    self.processes.add(key[0])
+                    self.evt_feature_tuples.add(key[1])
                 # Update process-event-feature count
-                count = proc_evt_feature_count.get((process_name, evt_feature_tuple), 0)
-                count += 1
-                proc_evt_feature_count[(process_name, evt_feature_tuple)] = count
+                proc_evt_feature_count[key] = proc_evt_feature_count.get(key, 0)+1
         # Return process-event-feature count and lines count
         yield proc_evt_feature_count, lines_count
+    def _process_line_chunks_impl(self, chunks, training):
+        feature_generators = self.feature_generators
+        # Processes and event-feature tuples of log, interned into local IDs
+        processes = []
+        process_ids = {}
+        evt_feature_tuples = []
+        evt_feature_ids = {}
+        # Process-event-feature codes (Local process ID in high 32 bits) and their counts
+        codes = np.zeros(0, dtype=np.int64)
+        counts = np.zeros(0, dtype=np.int64)
+        # Lines count
+        lines_count = 0
+        for chunk in chunks:
+            lines_count += len(chunk)
+            # Process ID and amount of event-feature tuples of each line, and event-feature tuple IDs of chunk
+            chunk_process_ids = []
+            chunk_tuple_counts = []
+            chunk_tuple_ids = []
+            for line in chunk:
+                process_id = process_ids.get(line.proc_name)
+                if process_id is None:
+                    process_id = process_ids[line.proc_name] = len(processes)
+                    processes.append(line.proc_name)
+                chunk_process_ids.append(process_id)
+                # Event-feature tuples by event and features (Event name only if there is no feature)
+                event_name = line.evt_type
+                event_tuple_ids = evt_feature_ids.get(event_name)
+                if event_tuple_ids is None:
+                    event_tuple_ids = evt_feature_ids[event_name] = {}
+                n_tuples = 0
+                for generator in feature_generators:
+                    for feature in generator(line):
+                        tuple_id = event_tuple_ids.get(feature)
+                        if tuple_id is None:
+                            tuple_id = event_tuple_ids[feature] = len(evt_feature_tuples)
+                            evt_feature_tuples.append((event_name,)+tuple(feature))
+                        chunk_tuple_ids.append(tuple_id)
+                        n_tuples += 1
+                if not n_tuples:
+                    tuple_id = event_tuple_ids.get(None)
+                    if tuple_id is None:
+                        tuple_id = event_tuple_ids[None] = len(evt_feature_tuples)
+                        evt_feature_tuples.append((event_name,))
+                    chunk_tuple_ids.append(tuple_id)
+                    n_tuples = 1
+                chunk_tuple_counts.append(n_tuples)
+            # Aggregate codes of chunk with codes counted so far
+            chunk_codes = np.repeat(
+                np.array(chunk_process_ids, dtype=np.int64),
+                np.array(chunk_tuple_counts, dtype=np.int64)
+            )
+            chunk_codes <<= 32
+            chunk_codes |= np.array(chunk_tuple_ids, dtype=np.int64)
+            codes, code_ids = np.unique(np.concatenate((codes, chunk_codes)), return_inverse=True)
+            counts = np.bincount(
+                code_ids.ravel(),
+                weights=np.concatenate((counts, np.ones(len(chunk_codes), dtype=np.int64))),
+                minlength=len(codes)
+            ).astype(np.int64)
+        process_ids = codes>>32
+        tuple_ids = codes&0xffffffff
+        # Count of each process-event-feature key
+        if not self.encodes_lines():
+            proc_evt_feature_count = dict(zip(
+                zip(
+                    [processes[i] for i in process_ids.tolist()],
+                    [evt_feature_tuples[i] for i in tuple_ids.tolist()]
+                ),
+                counts.tolist()
+            ))
+            # Add processes and event-feature tuples
+            if training:
+                self.update_vocabulary(proc_evt_feature_count)
+            yield proc_evt_feature_count, lines_count
+            return
+        # Count of each column (Hash bucket or vocabulary-based column)
+        if self.n_buckets:
+            columns = np.array([
+                self._bucket_column((processes[i], evt_feature_tuples[j]))
+                for i, j in zip(process_ids.tolist(), tuple_ids.tolist())
+            ], dtype=np.int64)
+        else:
+            vocabulary = self.vocabulary
+            vocabulary_process_ids = np.array([
+                vocabulary.process_ids.get(process_name, vocabulary.unknown_process_id)
+                for process_name in processes
+            ], dtype=np.int64)
+            vocabulary_tuple_ids = np.array([
+                vocabulary.evt_feature_ids.get(evt_feature_tuple, vocabulary.unknown_evt_feature_id)
+                for evt_feature_tuple in evt_feature_tuples
+            ], dtype=np.int64)
+            columns = vocabulary_process_ids[process_ids]*vocabulary.width+vocabulary_tuple_ids[tuple_ids]
+        # Several keys may share a column
+        columns, column_ids = np.unique(columns, return_inverse=True)
+        counts = np.bincount(column_ids.ravel(), weights=counts, minlength=len(columns)).astype(np.int64)
+        yield dict(zip(columns.tolist(), counts.tolist())), lines_count
+    def update_vocabulary(self, proc_evt_feature_count):
+        """ Add processes and event-feature tuples of a log to vocabulary. """
+        # Counted by column
+        if self.encodes_lines():
+            return
+        for process_name, evt_feature_tuple in proc_evt_feature_count:
+            self.processes.add(process_name)
+            self.evt_feature_tuples.add(evt_feature_tuple)
+    def freeze(self):
+        """ Freeze vocabulary collected from training logs (Lines are counted by column afterwards). """
+        if not self.n_buckets:
+            # Append new entries to base vocabulary
+            if self.base_vocabulary is not None:
+                self.vocabulary = self.base_vocabulary.extend(self.processes, self.evt_feature_tuples)
+            else:
+                self.vocabulary = Vocabulary.build(self.processes, self.evt_feature_tuples)
+        return self.vocabulary
     def process_lines(self, training=False):
         return functools.partial(self._process_lines_impl, training=training)
-    def count_freq(self, log_file_datum):
-        # Process and event-feature reverse look-up table
-        proc_rev = dict((
-            (proc, i) for (i, proc) in enumerate(sorted(self.processes))
-        ))
-        evt_feature_rev = dict((
-            (evt_opt, i) for (i, evt_opt) in enumerate(sorted(self.evt_feature_tuples))
-        ))
-        # Amount of total processes and event-feature tuples
-        n_proc = len(proc_rev)
-        n_evt_opt = len(evt_feature_rev)
+    def process_line_chunks(self, training=False):
+        """ Chunked version of process_lines, interning processes and event-feature tuples of each chunk
+            into integer arrays and aggregating their codes with NumPy. """
+        return functools.partial(self._process_line_chunks_impl, training=training)
+    def n_features(self):
+        """ Width of feature rows (Including unknown process and event-feature tuple). """
+        if self.n_buckets:
+            return self.n_buckets
+        return self.vocabulary.n_features()
+    def _bucket_column(self, key):
+        """ Hash bucket of process-event-feature key (Memoized for recently used keys). """
+        key_buckets = self._key_buckets
+        column = key_buckets.pop(key, None)
+        if column is None:
+            column = feature_hash(key[0], key[1], self.hash_seed)%self.n_buckets
+            # Evict least recently used key
+            if len(key_buckets)>=self.hash_memo_size:
+                if not key_buckets:
+                    return column
+                key_buckets.popitem(last=False)
+        # Mark key as recently used
+        key_buckets[key] = column
+        return column
+    def count_freq(self, log_file_datum, sampling_fraction=None):
+        """ Count frequency of each column on each log. If sampling fraction of lines is given, relative
+            standard error of each frequency is estimated as well. """
+        # Vocabulary not frozen yet
+        if not self.encodes_lines():
+            self.freeze()
+        # Map keys to hash buckets or vocabulary-based columns
+        column_func = self._bucket_column if self.n_buckets else self.vocabulary.column
         # Process each log file
         for proc_evt_feature_count, lines_count in log_file_datum:
-            # Frequency matrix
-            freq_matrix = np.zeros((n_proc+1, n_evt_opt+1))
-            # Process each pair
-            for (process_name, evt_feature_tuple), count in iteritems(proc_evt_feature_count):
-                # Look for index in matrix
-                proc_index = proc_rev.get(process_name, n_proc)
-                evt_opt_index = evt_feature_rev.get(evt_feature_tuple, n_evt_opt)
-                # Update matrix
-                freq_matrix[proc_index][evt_opt_index] += count
-            # Divide by lines count
-            freq_matrix /= lines_count
-            yield freq_matrix
+            column_count = proc_evt_feature_count
+            # Count of each column in flattened frequency matrix (Lines not counted by column)
+            if column_count and isinstance(next(iter(column_count)), tuple):
+                column_count = {}
+                for key, count in iteritems(proc_evt_feature_count):
+                    column = column_func(key)
+                    column_count[column] = column_count.get(column, 0)+count
+            # Sparse row indices and values
+            columns = sorted(column_count)
+            indices = np.array(columns, dtype=np.int64)
+            values = np.array([column_count[column] for column in columns], dtype=np.float64)
+            # Divide by lines count (Counted lines of sampled logs, which keeps frequencies unbiased)
+            values /= lines_count
+            if sampling_fraction is None:
+                yield indices, values
+            # Relative standard error of frequencies under simple random sampling of lines
+            else:
+                freqs = np.minimum(values, 1.0)
+                errors = np.sqrt((1.0-freqs)/(lines_count*freqs)*(1.0-sampling_fraction))
+                yield indices, values, errors
+    def freq_matrix(self, log_file_datum, sampling_fraction=None):
+        """ Count frequency on each log and assemble rows into a sparse matrix. If sampling fraction of
+            lines is given, a matrix of relative standard errors with the same sparsity is returned as well. """
+        indptr = [0]
+        indices = []
+        values = []
+        errors = []
+        for row in self.count_freq(log_file_datum, sampling_fraction):
+            indices.append(row[0])
+            values.append(row[1])
+            if sampling_fraction is not None:
+                errors.append(row[2])
+            indptr.append(indptr[-1]+len(row[0]))
+        # Empty matrix
+        if not indices:
+            indices = values = errors = [np.zeros(0)]
+        shape = (len(indptr)-1, self.n_features())
+        x = csr_matrix((np.concatenate(values), np.concatenate(indices), indptr), shape=shape)
+        if sampling_fraction is None:
+            return x
+        return x, csr_matrix((np.concatenate(errors), np.concatenate(indices), indptr), shape=shape)
+
+class SlidingWindowCounter(object):
+    def __init__(self, freq_counter, window=10*(10**9), hop=10**9):
+        """ Initialize process-event-feature counter over a sliding time window (Times in nano seconds). """
+        ## Frequency counter providing feature generators
+        self.freq_counter = freq_counter
+        ## Window length
+        self.window = window
+        ## Interval between emitted windows
+        self.hop = hop
+        ## Process-event-feature count of lines in window
+        self.proc_evt_feature_count = {}
+        ## Time and process-event-feature keys of lines in window
+        self._entries = deque()
+        ## End time of next emitted window
+        self._next_emit = None
+        ## Offset added to event times after midnight
+        self._day_offset = 0
+        ## Time of last line
+        self._last_time = None
+    def _line_time(self, line):
+        """ Event time of line, continuing across midnight. """
+        evt_time = line.evt_time+self._day_offset
+        # Event time of day wrapped around midnight
+        if self._last_time is not None and evt_time<self._last_time-_NS_PER_DAY//2:
+            self._day_offset += _NS_PER_DAY
+            evt_time += _NS_PER_DAY
+        self._last_time = evt_time
+        return evt_time
+    def _expire(self, begin_time):
+        """ Remove lines before given time from window. """
+        entries = self._entries
+        count = self.proc_evt_feature_count
+        while entries and entries[0][0]<begin_time:
+            for key in entries.popleft()[1]:
+                key_count = count[key]-1
+                if key_count:
+                    count[key] = key_count
+                else:
+                    del count[key]
+    def _window_counts(self):
+        """ Snapshot of process-event-feature count and lines count in window. """
+        return dict(self.proc_evt_feature_count), len(self._entries)
+    def _process_lines_impl(self, lines, flush):
+        line_keys = self.freq_counter.key_func()
+        count = self.proc_evt_feature_count
+        for line in lines:
+            evt_time = self._line_time(line)
+            if self._next_emit is None:
+                self._next_emit = evt_time+self.hop
+            # Emit all windows ending before this line
+            while evt_time>=self._next_emit:
+                self._expire(self._next_emit-self.window)
+                # Skip over empty windows
+                if not self._entries:
+                    self._next_emit += ((evt_time-self._next_emit)//self.hop+1)*self.hop
+                    break
+                yield (self._next_emit,)+self._window_counts()
+                self._next_emit += self.hop
+            # Add line to window
+            keys = line_keys(line)
+            self._entries.append((evt_time, keys))
+            for key in keys:
+                count[key] = count.get(key, 0)+1
+        # Emit last window at the end of stream
+        if flush and self._entries:
+            self._expire(self._next_emit-self.window)
+            yield (self._next_emit,)+self._window_counts()
+    def process_lines(self, flush=True):
+        """ Pass yielding window end time, process-event-feature count and lines count every hop. Without
+            flushing, the last window is kept open so that the stream can be continued by another call. """
+        return functools.partial(self._process_lines_impl, flush=flush)
@@ -0,0 +1,161 @@
+from __future__ import unicode_literals, division, print_function
+import sys, json, time
+from collections import OrderedDict
+
+from .processing import pass_name
+
+# High resolution wall clock
+_clock = time.perf_counter if hasattr(time, "perf_counter") else time.time
+
+class PassStats(object):
+    def __init__(self, name):
+        """ Initialize statistics of a pass. """
+        ## Pass name
+        self.name = name
+        ## Amount of items received (None for stream sources)
+        self.items_in = None
+        ## Amount of items yielded (Lines of chunks are counted individually)
+        self.items_out = 0
+        ## Wall time spent in pass itself (Excluding preceding passes)
+        self.seconds = 0.0
+        ## Amount of errors raised by pass
+        self.errors = 0
+    def merge(self, other):
+        """ Add statistics of the same pass from another run. """
+        if other.items_in is not None:
+            self.items_in = (self.items_in or 0)+other.items_in
+        self.items_out += other.items_out
+        self.seconds += other.seconds
+        self.errors += other.errors
+
+def _timed_stream(stream, stats):
+    """ Yield items of stream, recording the wall time and amount of items pulled from it. """
+    stream = iter(stream)
+    while True:
+        begin = _clock()
+        try:
+            item = next(stream)
+        except StopIteration:
+            stats.seconds += _clock()-begin
+            return
+        except Exception as e:
+            stats.seconds += _clock()-begin
+            # Only count error in the pass raising it
+            if not getattr(e, "_sli_profiled", False):
+                stats.errors += 1
+                e._sli_profiled = True
+            raise
+        stats.seconds += _clock()-begin
+        stats.items_out += len(item) if type(item) is list else 1
+        yield item
+
+class PipelineProfiler(object):
+    def __init__(self):
+        """ Initialize profiler of log pipelines. """
+        ## Statistics of each pass
+        self.pass_stats = OrderedDict()
+        ## Lines read and wall time of each log file
+        self.file_stats = OrderedDict()
+    def _add_pass_stats(self, stats):
+        """ Add statistics of a pass to total. """
+        total_stats = self.pass_stats.get(stats.name)
+        if total_stats is None:
+            total_stats = self.pass_stats[stats.name] = PassStats(stats.name)
+        total_stats.merge(stats)
+    def log_pipeline(self, file_path, source, *passes):
+        """ Run log pipeline for a log file and collect results, recording statistics of each pass. """
+        all_stats = [PassStats(pass_name(source))]+[PassStats(pass_name(stream_pass)) for stream_pass in passes]
+        stream = _timed_stream(source, all_stats[0])
+        for stream_pass, stats in zip(passes, all_stats[1:]):
+            stream = _timed_stream(stream_pass(stream), stats)
+        begin = _clock()
+        try:
+            return list(stream)
+        finally:
+            seconds = _clock()-begin
+            # Time of each pass includes preceding passes it pulled items from
+            prev_stats = None
+            prev_seconds = 0.0
+            for stats in all_stats:
+                stats.seconds, prev_seconds = stats.seconds-prev_seconds, stats.seconds
+                if prev_stats is not None:
+                    stats.items_in = prev_stats.items_out
+                prev_stats = stats
+                self._add_pass_stats(stats)
+            # Log file totals
+            lines, total_seconds = self.file_stats.get(file_path, (0, 0.0))
+            self.file_stats[file_path] = (lines+all_stats[0].items_out, total_seconds+seconds)
+    def call(self, name, func, *args):
+        """ Call function outside of pipelines (Such as building frequency matrix), recording its wall time. """
+        stats = PassStats(name)
+        begin = _clock()
+        try:
+            result = func(*args)
+            # Rows of matrix results
+            stats.items_out = getattr(result, "shape", (1,))[0]
+            return result
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.seconds = _clock()-begin
+            self._add_pass_stats(stats)
+    def merge(self, other):
+        """ Add statistics recorded by another profiler (Such as in a worker process). """
+        for stats in other.pass_stats.values():
+            self._add_pass_stats(stats)
+        for file_path, (lines, seconds) in other.file_stats.items():
+            total_lines, total_seconds = self.file_stats.get(file_path, (0, 0.0))
+            self.file_stats[file_path] = (total_lines+lines, total_seconds+seconds)
+    def summary(self):
+        """ Summary of pass and log file statistics. """
+        total_seconds = sum(stats.seconds for stats in self.pass_stats.values())
+        return {
+            "total_seconds": total_seconds,
+            "passes": [{
+                "name": stats.name,
+                "items_in": stats.items_in,
+                "items_out": stats.items_out,
+                "seconds": stats.seconds,
+                "items_per_sec": (stats.items_in or stats.items_out)/stats.seconds if stats.seconds else None,
+                "percent": 100*stats.seconds/total_seconds if total_seconds else None,
+                "errors": stats.errors
+            } for stats in self.pass_stats.values()],
+            "files": [{
+                "path": file_path,
+                "lines": lines,
+                "seconds": seconds,
+                "lines_per_sec": lines/seconds if seconds else None
+            } for file_path, (lines, seconds) in self.file_stats.items()]
+        }
+    def format_summary(self):
+        """ Human readable summary of pass and log file statistics. """
+        summary = self.summary()
+        rows = ["{:<24}{:>12}{:>12}{:>10}{:>14}{:>8}{:>8}".format(
+            "pass", "items in", "items out", "seconds", "items/sec", "%", "errors"
+        )]
+        for stats in summary["passes"]:
+            rows.append("{:<24}{:>12}{:>12}{:>10.3f}{:>14.0f}{:>8.1f}{:>8}".format(
+                stats["name"],
+                "-" if stats["items_in"] is None else stats["items_in"],
+                stats["items_out"],
+                stats["seconds"],
+                stats["items_per_sec"] or 0,
+                stats["percent"] or 0,
+                stats["errors"]
+            ))
+        rows.append("{:<24}{:>46.3f}".format("total", summary["total_seconds"]))
+        rows.append("")
+        rows.append("{:<60}{:>12}{:>10}{:>14}".format("file", "lines", "seconds", "lines/sec"))
+        for stats in summary["files"]:
+            rows.append("{:<60}{:>12}{:>10.3f}{:>14.0f}".format(
+                stats["path"], stats["lines"], stats["seconds"], stats["lines_per_sec"] or 0
+            ))
+        return "\n".join(rows)
+    def write_summary(self, path="-"):
+        """ Print summary to standard error ("-") or write it as JSON to file. """
+        if path=="-":
+            print(self.format_summary(), file=sys.stderr)
+        else:
+            with open(path, "w") as f:
+                json.dump(self.summary(), f, indent=2)
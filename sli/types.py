@@ -1,33 +1,87 @@
 from __future__ import unicode_literals, division, print_function
-from namedlist import namedlist
 
-# Log line data
-LogLine = namedlist("LogLine", [
-    "evt_num",
-    "evt_time",
-    "evt_cpu",
-    "proc_name",
-    "thread_tid",
-    "evt_dir",
-    "evt_type",
-    "evt_args"
-])
+try:
+    # Interpreter string interning (Interned strings are freed once no longer referenced)
+    from sys import intern as _intern
+except ImportError:
+    # Python 2 cannot intern unicode strings
+    _intern = None
 
-# Optional argument
-OptArg = namedlist("OptArg", [
-    "value",
-    "options"
-])
+def intern_string(string):
+    """ Get the shared instance of a frequently repeated string (Process names, event types, etc.). """
+    if _intern is None:
+        return string
+    return _intern(string)
 
-# System call error argument
-SyscallErrorArg = namedlist("SyscallErrorArg", [
-    "value",
-    "name"
-])
+class _Record(object):
+    """ Base class of compact mutable records with sequence behavior of named lists. """
+    __slots__ = ()
+    # Records are mutable
+    __hash__ = None
+    def __iter__(self):
+        return (getattr(self, field) for field in self.__slots__)
+    def __len__(self):
+        return len(self.__slots__)
+    def __getitem__(self, i):
+        return getattr(self, self.__slots__[i])
+    def __setitem__(self, i, value):
+        setattr(self, self.__slots__[i], value)
+    def __eq__(self, other):
+        return type(self) is type(other) and tuple(self)==tuple(other)
+    def __ne__(self, other):
+        return not self==other
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ", ".join(
+            "{}={!r}".format(field, getattr(self, field)) for field in self.__slots__
+        ))
+    def __getstate__(self):
+        return tuple(self)
+    def __setstate__(self, state):
+        for field, value in zip(self.__slots__, state):
+            setattr(self, field, value)
+    def _asdict(self):
+        return dict(zip(self.__slots__, self))
 
-# File descriptor argument
-FdArg = namedlist("FdArg", [
-    "fd_val",
-    "fd_type",
-    "location"
-])
+class LogLine(_Record):
+    """ Log line data. """
+    __slots__ = (
+        "evt_num",
+        "evt_time",
+        "evt_cpu",
+        "proc_name",
+        "thread_tid",
+        "evt_dir",
+        "evt_type",
+        "evt_args"
+    )
+    def __init__(self, evt_num, evt_time, evt_cpu, proc_name, thread_tid, evt_dir, evt_type, evt_args):
+        self.evt_num = evt_num
+        self.evt_time = evt_time
+        self.evt_cpu = evt_cpu
+        self.proc_name = proc_name
+        self.thread_tid = thread_tid
+        self.evt_dir = evt_dir
+        self.evt_type = evt_type
+        self.evt_args = evt_args
+
+class OptArg(_Record):
+    """ Optional argument. """
+    __slots__ = ("value", "options")
+    def __init__(self, value, options):
+        self.value = value
+        self.options = options
+
+class SyscallErrorArg(_Record):
+    """ System call error argument. """
+    __slots__ = ("value", "name")
+    def __init__(self, value, name):
+        self.value = value
+        self.name = name
+
+class FdArg(_Record):
+    """ File descriptor argument. """
+    __slots__ = ("fd_val", "fd_type", "location")
+    def __init__(self, fd_val, fd_type, location):
+        self.fd_val = fd_val
+        self.fd_type = fd_type
+        self.location = location